@@ -8,14 +8,15 @@ A production-ready Flask application with:
 """
 
 import os
+import sys
 import uuid
 import time
+import signal
 import logging
 import threading
 from datetime import datetime
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, Any, Optional
 
-import cv2
 import numpy as np
 from flask import Flask, request, jsonify, send_from_directory
 from flask_cors import CORS
@@ -23,6 +24,12 @@ from flask_socketio import SocketIO
 
 from config import config
 import database as db
+from cache import response_cache
+from detector import model_pool
+from forecast import demand_forecaster
+from imaging import extract_detections, render_annotated, load_reduced
+from ingest import DecodeBudget, UploadRejected, save_upload
+from retention import retention_manager
 
 # ============================================================================
 # LOGGING CONFIGURATION
@@ -45,6 +52,7 @@ logging.getLogger('socketio').setLevel(logging.WARNING)
 # ============================================================================
 
 app = Flask(__name__, static_folder=config.PROCESSED_FOLDER)
+app.config['MAX_CONTENT_LENGTH'] = config.MAX_UPLOAD_MB * 1024 * 1024
 
 # CORS Configuration
 if config.CORS_ORIGINS == ['*']:
@@ -62,34 +70,9 @@ config.ensure_directories()
 # MODEL LOADING
 # ============================================================================
 
-model = None
-
-
 def load_yolo_model():
-    """Load YOLOv8 model with fallback options."""
-    global model
-    try:
-        from ultralytics import YOLO
-        
-        # Try preferred model first, then fallback
-        models_to_try = [
-            config.get_model_path(config.PREFERRED_MODEL),
-            config.get_model_path('yolov8s.pt'),
-            config.get_model_path('yolov8n.pt'),
-        ]
-        
-        for model_path in models_to_try:
-            if os.path.exists(model_path):
-                model = YOLO(model_path)
-                logger.info(f"YOLO model loaded: {model_path}")
-                return True
-        
-        logger.warning("No YOLO model found in models folder. Vehicle detection disabled.")
-        return False
-        
-    except Exception as e:
-        logger.error(f"Failed to load YOLO model: {e}")
-        return False
+    """Load every model on the load-shedding ladder."""
+    return model_pool.load()
 
 
 # Load models at startup
@@ -118,12 +101,13 @@ class TrafficState:
         with self._lock:
             return self._data.copy()
     
-    def update_lane(self, direction: str, vehicle_count: int, image_url: str):
-        """Update a specific lane's data."""
+    def update_lane(self, direction: str, vehicle_count: int, image_url: str, **details):
+        """Update a specific lane's data, plus optional detection details."""
         with self._lock:
             self._data[direction] = {
                 "vehicle_count": vehicle_count,
-                "image_url": image_url
+                "image_url": image_url,
+                **details
             }
             self._data["last_updated"] = datetime.now().isoformat()
     
@@ -147,55 +131,49 @@ traffic_state = TrafficState()
 # VEHICLE DETECTION
 # ============================================================================
 
-def detect_vehicles(image_path: str) -> Tuple[str, int]:
+def detect_vehicles(image_path: str) -> Dict[str, Any]:
     """
     Detect vehicles in an image using YOLO.
     
+    The model and input size are chosen by the model pool, which steps
+    down to cheaper levels under backpressure. Large frames are decoded
+    at reduced resolution, just above the model input size, and boxes are
+    scaled back to the original. No annotated copy is written; overlays
+    are drawn by the dashboard or rendered on demand.
+    
     Returns:
-        Tuple of (processed_image_path, vehicle_count)
+        Dict with 'vehicle_count', 'detections' (boxes, classes, confidences),
+        'image_size' as [width, height] and 'model' (ladder level tag)
     
     Raises:
         ValueError: If model is not loaded or image processing fails
     """
-    if model is None:
+    if not model_pool.is_loaded:
         raise ValueError("YOLO model not loaded. Please ensure model files are in the models folder.")
     
     try:
-        # Run YOLO detection
-        results = model(image_path, verbose=False)
-        
-        # Filter for vehicle classes only
-        boxes = []
-        if results and len(results) > 0 and results[0].boxes:
-            all_boxes = results[0].boxes.data.cpu().numpy()
-            # Filter by vehicle classes (car, motorcycle, bus, truck)
-            boxes = [box for box in all_boxes if int(box[5]) in config.VEHICLE_CLASSES]
-        
-        vehicle_count = len(boxes)
-        
-        # Draw bounding boxes on image
-        image = cv2.imread(image_path)
+        image, scale = load_reduced(image_path, model_pool.max_input_size)
         if image is None:
             raise ValueError(f"Failed to load image: {image_path}")
         
-        for box in boxes:
-            x1, y1, x2, y2, conf, cls = box[:6]
-            x1, y1, x2, y2 = map(int, [x1, y1, x2, y2])
-            
-            # Color based on confidence
-            color = (0, 255, 0) if conf > 0.7 else (0, 255, 255)
-            cv2.rectangle(image, (x1, y1), (x2, y2), color, 2)
-            
-            # Add label
-            label = f"Vehicle {conf:.0%}"
-            cv2.putText(image, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+        # Run YOLO detection
+        with model_pool.acquire() as level:
+            results = level.predict(image)
         
-        # Save processed image
-        processed_path = os.path.join(config.PROCESSED_FOLDER, os.path.basename(image_path))
-        cv2.imwrite(processed_path, image)
+        if not results:
+            raise ValueError(f"Failed to load image: {image_path}")
         
-        logger.info(f"Detected {vehicle_count} vehicles in {os.path.basename(image_path)}")
-        return processed_path, vehicle_count
+        result = results[0]
+        detections = extract_detections(result, scale)
+        height, width = (round(side * scale) for side in result.orig_shape[:2])
+        
+        logger.info(f"Detected {len(detections)} vehicles in {os.path.basename(image_path)} ({level.tag})")
+        return {
+            "vehicle_count": len(detections),
+            "detections": detections,
+            "image_size": [int(width), int(height)],
+            "model": level.tag
+        }
         
     except Exception as e:
         logger.error(f"Vehicle detection error: {e}")
@@ -214,7 +192,10 @@ def health_check():
         "timestamp": datetime.now().isoformat(),
         "version": "2.0.0",
         "components": {
-            "yolo_model": "loaded" if model is not None else "not_loaded"
+            "yolo_model": "loaded" if model_pool.is_loaded else "not_loaded",
+            "model_pool": model_pool.status(),
+            "database": db.status(),
+            "cache": response_cache.status()
         }
     }), 200
 
@@ -229,7 +210,11 @@ def index():
             "health": "/health",
             "upload": "/upload (POST)",
             "traffic_data": "/process_traffic (GET)",
-            "static_files": "/static/<filename>"
+            "static_files": "/static/<filename>",
+            "uploads": "/uploads/<filename>",
+            "annotated_image": "/api/records/<record_id>/annotated",
+            "record_image": "/api/records/<record_id>/image/<full|medium|small>",
+            "forecast": "/api/forecast"
         }
     }), 200
 
@@ -248,7 +233,7 @@ def upload_files():
             "message": "Please upload images for traffic directions"
         }), 400
     
-    if model is None:
+    if not model_pool.is_loaded:
         return jsonify({
             "success": False,
             "error": "Model not available",
@@ -259,44 +244,82 @@ def upload_files():
         results = {}
         files = request.files.to_dict()
         
-        for direction, file in files.items():
-            if direction not in ["north", "east", "south", "west"]:
-                logger.warning(f"Ignoring unknown direction: {direction}")
-                continue
+        # Save and admit every file before decoding any, so an oversized
+        # request is rejected as a whole
+        uploads = []
+        budget = DecodeBudget(config.UPLOAD_DECODE_BUDGET_MB * 1024 * 1024)
+        try:
+            for direction, file in files.items():
+                if direction not in ["north", "east", "south", "west"]:
+                    logger.warning(f"Ignoring unknown direction: {direction}")
+                    continue
                 
-            if file.filename == "":
-                return jsonify({
-                    "success": False,
-                    "error": f"Empty file for {direction}",
-                    "message": f"No file selected for {direction} direction"
-                }), 400
-            
-            # Save with unique filename
-            ext = os.path.splitext(file.filename)[1] or '.jpg'
-            unique_filename = f"{direction}_{uuid.uuid4().hex}{ext}"
-            filepath = os.path.join(config.UPLOAD_FOLDER, unique_filename)
-            file.save(filepath)
-            
+                if file.filename == "":
+                    raise UploadRejected(f"No file selected for {direction} direction", status=400)
+                
+                # Save with unique filename
+                ext = os.path.splitext(file.filename)[1] or '.jpg'
+                unique_filename = f"{direction}_{uuid.uuid4().hex}{ext}"
+                filepath = os.path.join(config.UPLOAD_FOLDER, unique_filename)
+                save_upload(file, filepath, config.MAX_FILE_MB * 1024 * 1024)
+                uploads.append((direction, unique_filename, filepath))
+                budget.admit(filepath, file.filename)
+        except UploadRejected as e:
+            for _, _, filepath in uploads:
+                os.remove(filepath)
+            logger.warning(f"Upload rejected: {e}")
+            return jsonify({
+                "success": False,
+                "error": "Upload rejected",
+                "message": str(e)
+            }), e.status
+        
+        for direction, unique_filename, filepath in uploads:
             # Process image
-            processed_path, vehicle_count = detect_vehicles(filepath)
-            
-            # Build image URL
-            host_url = request.host_url.rstrip('/')
-            image_url = f"{host_url}/static/{os.path.basename(processed_path)}"
-            
-            # Update state
-            traffic_state.update_lane(direction, vehicle_count, image_url)
+            detection = detect_vehicles(filepath)
+            vehicle_count = detection["vehicle_count"]
             
             # Save to database
+            record_id = None
+            created_at = datetime.utcnow()
             try:
-                db.save_traffic_record(direction, vehicle_count, filepath, processed_path)
+                record_id = db.save_traffic_record(
+                    direction,
+                    vehicle_count,
+                    filepath,
+                    detections=detection["detections"],
+                    image_size=detection["image_size"],
+                    model=detection["model"],
+                    created_at=created_at
+                )
             except Exception as db_err:
                 logger.warning(f"Database save failed (non-critical): {db_err}")
             
-            results[direction] = {
+            # Build image URLs; the annotated view is rendered on first request
+            host_url = request.host_url.rstrip('/')
+            image_url = f"{host_url}/uploads/{unique_filename}"
+            annotated_url = f"{host_url}/api/records/{record_id}/annotated" if record_id else ""
+            # 'thumbnails' holds image IDs in stored records; live payloads carry URLs
+            thumbnail_urls = {
+                size: f"{host_url}/api/records/{record_id}/image/{size}"
+                for size in config.THUMBNAIL_SIZES
+            } if record_id else {}
+            
+            lane = {
                 "vehicle_count": vehicle_count,
-                "image_url": image_url
+                "image_url": image_url,
+                "annotated_url": annotated_url,
+                "thumbnail_urls": thumbnail_urls,
+                "record_id": record_id,
+                "detections": detection["detections"],
+                "image_size": detection["image_size"],
+                "model": detection["model"]
             }
+            
+            # Update state and the demand forecast
+            traffic_state.update_lane(direction, **lane)
+            demand_forecaster.observe(direction, vehicle_count, at=created_at)
+            results[direction] = lane
         
         # Emit real-time update
         current_state = traffic_state.get()
@@ -307,7 +330,8 @@ def upload_files():
         return jsonify({
             "success": True,
             "message": "Files uploaded and processed successfully",
-            "data": current_state
+            "data": current_state,
+            "results": results
         }), 200
         
     except ValueError as e:
@@ -326,6 +350,16 @@ def upload_files():
         }), 500
 
 
+@app.errorhandler(413)
+def request_too_large(e):
+    """Reject bodies over MAX_UPLOAD_MB before they are parsed."""
+    return jsonify({
+        "success": False,
+        "error": "Upload rejected",
+        "message": f"Requests are limited to {config.MAX_UPLOAD_MB} MB"
+    }), 413
+
+
 @app.route("/process_traffic", methods=["GET"])
 def get_traffic_data():
     """Get the current traffic state for all directions."""
@@ -338,6 +372,12 @@ def serve_static(filename):
     return send_from_directory(config.PROCESSED_FOLDER, filename)
 
 
+@app.route("/uploads/<path:filename>")
+def serve_upload(filename):
+    """Serve raw uploaded frames; overlays are drawn client-side from detections."""
+    return send_from_directory(config.UPLOAD_FOLDER, filename)
+
+
 # ============================================================================
 # DATABASE API ENDPOINTS
 # ============================================================================
@@ -350,7 +390,10 @@ def get_history():
         page = int(request.args.get('page', 1))
         per_page = int(request.args.get('per_page', 20))
         
-        result = db.get_history(direction=direction, page=page, per_page=per_page)
+        result = response_cache.get_or_compute(
+            'history', (direction, page, per_page), config.CACHE_TTL_HISTORY,
+            lambda: db.get_history(direction=direction, page=page, per_page=per_page)
+        )
         return jsonify({"success": True, **result}), 200
     except Exception as e:
         logger.error(f"History API error: {e}")
@@ -364,7 +407,10 @@ def get_trends():
         period = request.args.get('period', 'hourly')
         days = int(request.args.get('days', 7))
         
-        trends = db.get_trends(period=period, days=days)
+        trends = response_cache.get_or_compute(
+            'trends', (period, days), config.CACHE_TTL_TRENDS,
+            lambda: db.get_trends(period=period, days=days)
+        )
         return jsonify({"success": True, "trends": trends}), 200
     except Exception as e:
         logger.error(f"Trends API error: {e}")
@@ -375,26 +421,122 @@ def get_trends():
 def get_stats():
     """Get traffic statistics summary."""
     try:
-        stats = db.get_stats()
+        stats = response_cache.get_or_compute('stats', (), config.CACHE_TTL_STATS, db.get_stats)
         return jsonify({"success": True, "stats": stats}), 200
     except Exception as e:
         logger.error(f"Stats API error: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+@app.route("/api/cache/stats", methods=["GET"])
+def get_cache_stats():
+    """Get response cache hit rates and invalidation counts."""
+    return jsonify({"success": True, "cache": response_cache.status()}), 200
+
+
+@app.route("/api/forecast", methods=["GET"])
+def get_forecast():
+    """Get next-cycle demand forecasts with accuracy and compute cost."""
+    forecast = demand_forecaster.status(signal_controller.cycle_seconds)
+    return jsonify({"success": True, "forecast": forecast}), 200
+
+
 @app.route("/api/image/<image_id>")
 def get_db_image(image_id):
     """Get image from GridFS by ID."""
     try:
         from flask import Response
-        image_data = db.get_image(image_id)
-        if image_data:
-            return Response(image_data, mimetype='image/jpeg')
+        image = db.get_image(image_id)
+        if image:
+            image_data, content_type = image
+            response = Response(image_data, mimetype=content_type)
+            # Stored images never change once written
+            response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+            return response
         return jsonify({"error": "Image not found"}), 404
     except Exception as e:
         logger.error(f"Image API error: {e}")
         return jsonify({"error": str(e)}), 500
 
+
+@app.route("/api/records/<record_id>/image/<size>")
+def get_record_image(record_id, size):
+    """Get a record's stored frame ('full') or one of its thumbnails by name."""
+    record = db.get_record(record_id)
+    if not record:
+        return jsonify({"error": "Record not found"}), 404
+    
+    image_id = record['original_image_id'] if size == 'full' else record['thumbnails'].get(size)
+    if not image_id:
+        return jsonify({"error": f"No {size} image for record"}), 404
+    return get_db_image(image_id)
+
+
+@app.route("/api/records/<record_id>/annotated")
+def get_annotated_image(record_id):
+    """
+    Get a record's frame with detection overlays.
+    
+    Rendered from the stored original and detections on first request,
+    then served from a cache file in the processed folder.
+    """
+    if not record_id.isalnum():
+        return jsonify({"error": "Invalid record id"}), 400
+    
+    cache_name = f"annotated_{record_id}.jpg"
+    cache_path = os.path.join(config.PROCESSED_FOLDER, cache_name)
+    if os.path.exists(cache_path):
+        return send_from_directory(config.PROCESSED_FOLDER, cache_name)
+    
+    try:
+        record = db.get_record(record_id)
+        if not record:
+            return jsonify({"error": "Record not found"}), 404
+        
+        # Records written before structured detections kept an eager annotated copy
+        if record.get('processed_image_id'):
+            image = db.get_image(record['processed_image_id'])
+            image_data = image[0] if image else None
+        else:
+            # Fall back to the largest thumbnail once the raw frame has expired
+            source_id = record.get('original_image_id') or max(
+                record['thumbnails'].items(), key=lambda item: config.THUMBNAIL_SIZES.get(item[0], 0),
+                default=(None, None)
+            )[1]
+            original = db.get_image(source_id) if source_id else None
+            image_data = render_annotated(
+                original[0], record.get('detections') or [], record.get('image_size')
+            ) if original else None
+        
+        if not image_data:
+            return jsonify({"error": "Image not found"}), 404
+        
+        # Write atomically so concurrent requests never serve a partial file
+        tmp_path = f"{cache_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(image_data)
+        os.replace(tmp_path, cache_path)
+        
+        return send_from_directory(config.PROCESSED_FOLDER, cache_name)
+    except Exception as e:
+        logger.error(f"Annotated image API error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/retention", methods=["GET"])
+def get_retention_status():
+    """Get retention sweep, quota and compaction progress."""
+    return jsonify({"success": True, "retention": retention_manager.status()}), 200
+
+
+@app.route("/api/retention/run", methods=["POST"])
+def run_retention():
+    """Trigger a retention sweep without waiting for the next interval."""
+    if not retention_manager.running:
+        return jsonify({"success": False, "error": "Retention manager is disabled"}), 409
+    retention_manager.trigger()
+    return jsonify({"success": True, "message": "Retention sweep scheduled"}), 202
+
 # ============================================================================
 # WEBSOCKET EVENTS
 # ============================================================================
@@ -438,28 +580,45 @@ class TrafficSignalController:
         self.running = False
         self._thread = None
     
+    @property
+    def cycle_seconds(self) -> int:
+        """Nominal time for every lane to get one green phase."""
+        return len(self.sequence) * config.BASE_SIGNAL_DURATION
+    
+    def lane_demand(self, lane: str, data: Dict) -> float:
+        """
+        Expected vehicles for a lane: the last count blended with the
+        forecast for the next cycle, so rising demand is served early.
+        """
+        vehicle_count = data.get(lane, {}).get("vehicle_count", 0)
+        if config.FORECAST_WEIGHT <= 0:
+            return vehicle_count
+        
+        predicted = demand_forecaster.forecast_cycle(lane, self.cycle_seconds)
+        if predicted is None:
+            return vehicle_count
+        return (1 - config.FORECAST_WEIGHT) * vehicle_count + config.FORECAST_WEIGHT * predicted
+    
     def calculate_signal_duration(self, lane: str, data: Dict) -> int:
         """Calculate green signal duration based on traffic conditions."""
-        lane_data = data.get(lane, {})
-        vehicle_count = lane_data.get("vehicle_count", 0)
+        demand = self.lane_demand(lane, data)
         
-        # Scale duration based on vehicle count (capped at 3x base)
-        vehicle_factor = min(vehicle_count / 5, 3.0)
+        # Scale duration based on expected vehicles (capped at 3x base)
+        vehicle_factor = min(demand / 5, 3.0)
         return int(config.BASE_SIGNAL_DURATION * max(1, vehicle_factor))
     
     def select_next_lane(self) -> str:
-        """Select the next lane based on vehicle count and wait time."""
+        """Select the next lane based on expected vehicles and wait time."""
         data = traffic_state.get()
         max_score = -1
         selected_lane = self.sequence[0]
         
         for lane in self.sequence:
-            lane_data = data.get(lane, {})
-            vehicle_count = lane_data.get("vehicle_count", 0)
+            demand = self.lane_demand(lane, data)
             
             # Score: vehicles * wait_time
             self.wait_times[lane] += 1
-            score = vehicle_count * self.wait_times[lane]
+            score = demand * self.wait_times[lane]
             
             if score > max_score:
                 max_score = score
@@ -517,10 +676,14 @@ class TrafficSignalController:
             self._thread.join(timeout=5)
 
 
-# Initialize and start signal controller
+# Seed the demand forecast from stored history, then start the signal controller
+demand_forecaster.load_async()
 signal_controller = TrafficSignalController()
 signal_controller.start()
 
+# Start background storage retention
+retention_manager.start()
+
 # ============================================================================
 # APPLICATION ENTRY POINT
 # ============================================================================
@@ -531,9 +694,12 @@ if __name__ == "__main__":
     logger.info("=" * 60)
     logger.info(f"Debug Mode: {config.DEBUG}")
     logger.info(f"Host: {config.HOST}:{config.PORT}")
-    logger.info(f"YOLO Model: {'Loaded' if model else 'Not Available'}")
+    logger.info(f"YOLO Model: {model_pool.status()['active'] or 'Not Available'}")
     logger.info("=" * 60)
     
+    # Exit through the finally block (and atexit hooks) on SIGTERM too
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    
     try:
         socketio.run(
             app,
@@ -543,4 +709,6 @@ if __name__ == "__main__":
             use_reloader=config.DEBUG
         )
     finally:
-        signal_controller.stop()
\ No newline at end of file
+        signal_controller.stop()
+        retention_manager.stop()
+        db.close()
\ No newline at end of file
@@ -0,0 +1,389 @@
+"""
+TrafficIQ Historical Backfill
+=============================
+Bulk-loads archived intersection frames into the traffic history:
+- Accepts a directory or zip of <direction>_<timestamp> images
+- Runs detection in fixed-size batches of reduced-resolution frames
+- Uses the capture timestamp from each file name as created_at
+- Writes each batch with one bulk insert
+- Checkpoints finished frames so an interrupted run can be resumed
+- Deterministic record IDs, so frames written just before a crash are not stored twice
+
+Usage:
+    python backfill.py archive.zip --batch-size 16
+    python backfill.py /mnt/frames --utc-offset 5.5 --skip-images
+"""
+
+import os
+import re
+import sys
+import time
+import shutil
+import zipfile
+import hashlib
+import logging
+import argparse
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Iterator, List, Optional, Set
+
+from config import config
+from detector import model_pool
+from imaging import extract_detections, load_reduced
+import database as db
+
+logger = logging.getLogger('TrafficIQ.Backfill')
+
+FRAME_NAME_PATTERN = re.compile(r'^(north|east|south|west)[_-](.+)$', re.IGNORECASE)
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.bmp'}
+
+# Wall-clock formats, tried in order; epoch seconds/milliseconds are handled separately
+TIMESTAMP_FORMATS = [
+    '%Y%m%d_%H%M%S',
+    '%Y%m%dT%H%M%S',
+    '%Y%m%d%H%M%S',
+    '%Y-%m-%d_%H-%M-%S',
+    '%Y-%m-%dT%H-%M-%S',
+    '%Y-%m-%d %H-%M-%S',
+    '%Y%m%d_%H%M%S_%f',
+    '%Y-%m-%dT%H-%M-%S.%f',
+]
+
+
+# ============================================================================
+# FRAME NAMES
+# ============================================================================
+
+def parse_timestamp(text: str, utc_offset: timedelta = timedelta(0)) -> Optional[datetime]:
+    """
+    Parse the timestamp part of a frame name into naive UTC.
+
+    Epoch values are UTC by definition; wall-clock values are shifted by
+    utc_offset (the camera's offset from UTC) unless they carry their own.
+    """
+    if text.isdigit() and len(text) in (10, 13):
+        seconds = int(text) / 1000 if len(text) == 13 else int(text)
+        return datetime.fromtimestamp(seconds, timezone.utc).replace(tzinfo=None)
+
+    for fmt in TIMESTAMP_FORMATS:
+        try:
+            return datetime.strptime(text, fmt) - utc_offset
+        except ValueError:
+            continue
+
+    try:
+        value = datetime.fromisoformat(text)
+    except ValueError:
+        return None
+    if value.tzinfo:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value - utc_offset
+
+
+def parse_frame_name(name: str, utc_offset: timedelta = timedelta(0)) -> Optional[Dict[str, Any]]:
+    """Split 'north_20240501_081500.jpg' into direction and capture time."""
+    stem, extension = os.path.splitext(os.path.basename(name))
+    if extension.lower() not in IMAGE_EXTENSIONS:
+        return None
+    match = FRAME_NAME_PATTERN.match(stem)
+    if not match:
+        return None
+    created_at = parse_timestamp(match.group(2), utc_offset)
+    if created_at is None:
+        return None
+    return {'name': name, 'direction': match.group(1).lower(), 'created_at': created_at}
+
+
+# ============================================================================
+# SOURCES
+# ============================================================================
+
+class DirectorySource:
+    """Frames in a directory tree, read in place."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def names(self) -> Iterator[str]:
+        for root, _, files in os.walk(self.path):
+            for filename in files:
+                yield os.path.relpath(os.path.join(root, filename), self.path)
+
+    @contextmanager
+    def open_batch(self, names: List[str]) -> Iterator[List[str]]:
+        yield [os.path.join(self.path, name) for name in names]
+
+
+class ZipSource:
+    """
+    Frames in a zip archive.
+
+    Only the current batch is extracted, to a temporary directory that is
+    removed before the next batch, so disk and memory use do not grow
+    with the archive.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._zip = zipfile.ZipFile(path)
+
+    def names(self) -> Iterator[str]:
+        for info in self._zip.infolist():
+            if not info.is_dir():
+                yield info.filename
+
+    @contextmanager
+    def open_batch(self, names: List[str]) -> Iterator[List[str]]:
+        with tempfile.TemporaryDirectory(prefix='trafficiq-backfill-') as tmp_dir:
+            paths = []
+            for i, name in enumerate(names):
+                # Member names are never used as paths, so archives cannot write outside tmp_dir
+                path = os.path.join(tmp_dir, f"{i}{os.path.splitext(name)[1].lower()}")
+                with self._zip.open(name) as src, open(path, 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+                paths.append(path)
+            yield paths
+
+    def close(self):
+        self._zip.close()
+
+
+def open_source(path: str):
+    if os.path.isdir(path):
+        return DirectorySource(path)
+    if zipfile.is_zipfile(path):
+        return ZipSource(path)
+    raise SystemExit(f"Not a directory or zip archive: {path}")
+
+
+# ============================================================================
+# CHECKPOINT
+# ============================================================================
+
+class Checkpoint:
+    """Append-only list of finished frame names; one line per frame."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done: Set[str] = set()
+        if os.path.exists(path):
+            with open(path) as f:
+                self.done = {line.rstrip('\n') for line in f if line.strip()}
+
+    def mark(self, names: List[str]):
+        """Record finished frames durably before the next batch starts."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, 'a') as f:
+            f.writelines(f"{name}\n" for name in names)
+            f.flush()
+            os.fsync(f.fileno())
+        self.done.update(names)
+
+
+def frame_record_id(source_path: str, name: str) -> str:
+    """
+    Deterministic record ID for a frame, so a rerun never stores it twice.
+
+    A batch can be partly written (a failed bulk insert, or a crash between
+    the insert and the checkpoint); on resume those frames are skipped by
+    the storage backend instead of being counted again.
+    """
+    key = f"{os.path.abspath(source_path)}\0{name}".encode()
+    return hashlib.sha1(key).hexdigest()[:24]
+
+
+def default_checkpoint_path(source_path: str) -> str:
+    """One checkpoint per source, stable across runs from any working directory."""
+    digest = hashlib.sha1(os.path.abspath(source_path).encode()).hexdigest()[:10]
+    name = os.path.basename(os.path.normpath(source_path)) or 'source'
+    return os.path.join(config.BACKFILL_STATE_FOLDER, f"{name}-{digest}.done")
+
+
+# ============================================================================
+# DETECTION
+# ============================================================================
+
+def detect_batch(level, paths: List[str]) -> List[Optional[Dict[str, Any]]]:
+    """
+    Detect vehicles in a batch of frames with one model call.
+
+    Frames are decoded at reduced resolution just above the model input
+    size, so a batch of large photos stays small in memory. Unreadable
+    frames come back as None.
+    """
+    decoded = [load_reduced(path, level.imgsz) for path in paths]
+    readable = [(image, scale) for image, scale in decoded if image is not None]
+    if len(readable) < len(paths):
+        logger.warning(f"Skipping {len(paths) - len(readable)} unreadable frame(s)")
+
+    results = iter(level.predict([image for image, _ in readable]) if readable else [])
+    summaries = []
+    for image, scale in decoded:
+        if image is None:
+            summaries.append(None)
+            continue
+        result = next(results)
+        detections = extract_detections(result, scale)
+        height, width = (round(side * scale) for side in result.orig_shape[:2])
+        summaries.append({
+            'vehicle_count': len(detections),
+            'detections': detections,
+            'image_size': [int(width), int(height)],
+            'model': level.tag
+        })
+    return summaries
+
+
+# ============================================================================
+# PROGRESS
+# ============================================================================
+
+def format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+class Progress:
+    """Counters plus throughput and ETA for the current run."""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.started = time.time()
+        self.processed = 0
+        self.saved = 0
+        self.failed = 0
+
+    def update(self, processed: int, saved: int, failed: int):
+        self.processed += processed
+        self.saved += saved
+        self.failed += failed
+
+        elapsed = time.time() - self.started
+        rate = self.processed / elapsed if elapsed > 0 else 0.0
+        eta = (self.total - self.processed) / rate if rate > 0 else 0.0
+        percent = 100.0 * self.processed / self.total if self.total else 100.0
+        logger.info(f"[{self.processed}/{self.total} {percent:5.1f}%] saved={self.saved} "
+                    f"failed={self.failed} {rate:.1f} frames/s ETA {format_duration(eta)}")
+
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+def plan(source, checkpoint: Checkpoint, utc_offset: timedelta) -> List[Dict[str, Any]]:
+    """Parse every frame name and return the pending frames in capture order."""
+    frames = []
+    unparsable = resumed = 0
+    for name in source.names():
+        if name in checkpoint.done:
+            resumed += 1
+            continue
+        frame = parse_frame_name(name, utc_offset)
+        if frame is None:
+            unparsable += 1
+            logger.debug(f"Ignoring {name}: not a <direction>_<timestamp> image")
+            continue
+        frames.append(frame)
+
+    frames.sort(key=lambda frame: frame['created_at'])
+    if resumed:
+        logger.info(f"Resuming: {resumed} frame(s) already done")
+    if unparsable:
+        logger.warning(f"Ignoring {unparsable} file(s) not named <direction>_<timestamp>.<ext>")
+    return frames
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Backfill traffic history from archived frames")
+    parser.add_argument('source', help="Directory or zip archive of <direction>_<timestamp> images")
+    parser.add_argument('--batch-size', type=int, default=config.BACKFILL_BATCH_SIZE,
+                        help="Frames per detection call and bulk insert")
+    parser.add_argument('--utc-offset', type=float, default=0.0,
+                        help="Hours the camera clock is ahead of UTC, for wall-clock names")
+    parser.add_argument('--skip-images', action='store_true',
+                        help="Store counts and detections only, not the frames")
+    parser.add_argument('--checkpoint', default=None,
+                        help="Checkpoint file (default: one per source in BACKFILL_STATE_FOLDER)")
+    parser.add_argument('--restart', action='store_true',
+                        help="Ignore the checkpoint and process every frame again "
+                             "(records already stored are kept, not duplicated)")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Only report which frames would be loaded")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    args = parse_args(argv)
+    if args.batch_size < 1:
+        raise SystemExit("--batch-size must be at least 1")
+
+    source = open_source(args.source)
+    checkpoint_path = args.checkpoint or default_checkpoint_path(args.source)
+    if args.restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    checkpoint = Checkpoint(checkpoint_path)
+
+    frames = plan(source, checkpoint, timedelta(hours=args.utc_offset))
+    if not frames:
+        logger.info("Nothing to backfill")
+        return 0
+    logger.info(f"{len(frames)} frame(s) from {frames[0]['created_at']:%Y-%m-%d %H:%M} "
+                f"to {frames[-1]['created_at']:%Y-%m-%d %H:%M} UTC; checkpoint {checkpoint_path}")
+    if args.dry_run:
+        return 0
+
+    if not model_pool.load():
+        logger.error("No YOLO model could be loaded; see the models folder")
+        return 1
+    level = model_pool.top
+    logger.info(f"Detecting with {level.tag} in batches of {args.batch_size}")
+
+    progress = Progress(len(frames))
+    try:
+        for start in range(0, len(frames), args.batch_size):
+            batch = frames[start:start + args.batch_size]
+            with source.open_batch([frame['name'] for frame in batch]) as paths:
+                summaries = detect_batch(level, paths)
+                records = [
+                    {
+                        'record_id': frame_record_id(args.source, frame['name']),
+                        'direction': frame['direction'],
+                        'original_image_path': '' if args.skip_images else path,
+                        'created_at': frame['created_at'],
+                        **summary
+                    }
+                    for frame, path, summary in zip(batch, paths, summaries)
+                    if summary is not None
+                ]
+                if records and len(db.save_traffic_records(records)) != len(records):
+                    logger.error("Bulk insert failed; rerun the same command to resume")
+                    return 1
+
+            # Unreadable frames are marked too, so a resume does not retry them forever
+            checkpoint.mark([frame['name'] for frame in batch])
+            progress.update(len(batch), len(records), len(batch) - len(records))
+
+    except KeyboardInterrupt:
+        logger.warning("Interrupted; rerun the same command to resume")
+        return 130
+    finally:
+        db.close()
+        if isinstance(source, ZipSource):
+            source.close()
+
+    logger.info(f"Backfill complete: {progress.saved} record(s) saved, {progress.failed} frame(s) "
+                f"skipped in {format_duration(time.time() - progress.started)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
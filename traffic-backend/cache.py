@@ -0,0 +1,159 @@
+"""
+TrafficIQ Cache Module
+======================
+In-process response cache for the read APIs (/api/stats, /api/trends,
+/api/history):
+- Entries keyed on endpoint and normalized query parameters, with per-endpoint TTLs
+- A data version bumped by every storage write, which drops all entries
+- Single-flight recomputation: concurrent misses for one key share one query
+- Results computed while storage is failing are returned but never cached
+- Hit, miss and coalescing counters per endpoint
+"""
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+from config import config
+from storage import get_backend
+
+logger = logging.getLogger('TrafficIQ.Cache')
+
+
+def _storage_state() -> Tuple[bool, int]:
+    """(available, failure count) of the storage backend; reads swallow failures, so compare before and after."""
+    backend = get_backend()
+    return backend.available(), backend.failure_count()
+
+
+class _Flight:
+    """One in-progress computation that other callers can wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.failed = False
+
+
+class ResponseCache:
+    """TTL + version-invalidated cache with single-flight misses."""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._version = 0
+        self._entries: 'OrderedDict[Tuple, Tuple[float, Any]]' = OrderedDict()  # key -> (expires, value)
+        self._flights: Dict[Tuple, _Flight] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._invalidations = 0
+        self._invalidated_entries = 0
+        self._degraded = 0
+
+    def _counter(self, endpoint: str) -> Dict[str, int]:
+        """Per-endpoint counters; caller holds the lock."""
+        return self._stats.setdefault(endpoint, {
+            'hits': 0, 'misses': 0, 'coalesced': 0, 'expired': 0
+        })
+
+    def invalidate(self):
+        """Mark every cached response stale; called after each storage write."""
+        with self._lock:
+            self._version += 1
+            self._invalidations += 1
+            self._invalidated_entries += len(self._entries)
+            self._entries.clear()
+
+    def get_or_compute(self, endpoint: str, params: Hashable, ttl: float, compute: Callable[[], Any]) -> Any:
+        """
+        Return the cached value for (endpoint, params) or compute it once.
+
+        Concurrent callers missing the same key at the same data version
+        wait for the first caller's result instead of querying storage
+        themselves. Results computed while a write lands, or while storage
+        is unavailable or failing, are returned but not served to later
+        callers.
+        """
+        if not config.CACHE_ENABLED or ttl <= 0:
+            return compute()
+
+        key = (endpoint, params)
+        now = time.monotonic()
+        with self._lock:
+            counter = self._counter(endpoint)
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    counter['hits'] += 1
+                    return value
+                del self._entries[key]
+                counter['expired'] += 1
+
+            version = self._version
+            flight = self._flights.get((key, version))
+            leader = flight is None
+            if leader:
+                flight = self._flights[(key, version)] = _Flight()
+                counter['misses'] += 1
+            else:
+                counter['coalesced'] += 1
+
+        if not leader:
+            flight.done.wait(config.CACHE_FLIGHT_TIMEOUT)
+            if flight.done.is_set() and not flight.failed:
+                return flight.value
+            return compute()
+
+        try:
+            state = _storage_state()
+            value = compute()
+        except BaseException:
+            flight.failed = True
+            raise
+        else:
+            flight.value = value
+            # Empty results from a failing backend would otherwise outlive the outage
+            healthy = state[0] and _storage_state() == state
+            with self._lock:
+                if not healthy:
+                    self._degraded += 1
+                elif version == self._version:
+                    self._entries[key] = (time.monotonic() + ttl, value)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            return value
+        finally:
+            with self._lock:
+                self._flights.pop((key, version), None)
+            flight.done.set()
+
+    def status(self) -> Dict[str, Any]:
+        """Hit rates per endpoint and overall since startup."""
+        with self._lock:
+            endpoints = {}
+            for endpoint, counter in self._stats.items():
+                lookups = counter['hits'] + counter['misses'] + counter['coalesced']
+                endpoints[endpoint] = {
+                    **counter,
+                    # Coalesced callers were served without a storage query of their own
+                    'hit_rate': round((counter['hits'] + counter['coalesced']) / lookups, 3) if lookups else None
+                }
+            hits = sum(c['hits'] + c['coalesced'] for c in self._stats.values())
+            lookups = hits + sum(c['misses'] for c in self._stats.values())
+            return {
+                'enabled': config.CACHE_ENABLED,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'version': self._version,
+                'invalidations': self._invalidations,
+                'invalidated_entries': self._invalidated_entries,
+                'uncached_degraded': self._degraded,
+                'hit_rate': round(hits / lookups, 3) if lookups else None,
+                'endpoints': endpoints
+            }
+
+
+response_cache = ResponseCache(max_entries=config.CACHE_MAX_ENTRIES)
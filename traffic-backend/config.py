@@ -24,22 +24,118 @@ class Config:
     # Model Configuration
     MODEL_FOLDER = os.getenv('MODEL_FOLDER', 'models')
     PREFERRED_MODEL = os.getenv('PREFERRED_MODEL', 'yolov8s.pt')
+    MODEL_INPUT_SIZE = int(os.getenv('MODEL_INPUT_SIZE', 640))
+    # Reduced input sizes appended below the smallest model on the default ladder
+    MODEL_REDUCED_INPUT_SIZES = [int(s) for s in os.getenv('MODEL_REDUCED_INPUT_SIZES', '480,320').split(',') if s.strip()]
+    # Explicit ladder, best first, e.g. "yolov8s.pt@640,yolov8n.pt@640,yolov8n.pt@416"
+    MODEL_LADDER = os.getenv('MODEL_LADDER', '')
+    
+    # Load Shedding (step down the model ladder under backpressure)
+    LOAD_SHED_ENABLED = os.getenv('LOAD_SHED_ENABLED', 'True').lower() == 'true'
+    LOAD_SHED_QUEUE_HIGH = int(os.getenv('LOAD_SHED_QUEUE_HIGH', 4))
+    LOAD_SHED_QUEUE_LOW = int(os.getenv('LOAD_SHED_QUEUE_LOW', 1))
+    LOAD_SHED_LATENCY_HIGH_MS = float(os.getenv('LOAD_SHED_LATENCY_HIGH_MS', 1500))
+    LOAD_SHED_LATENCY_LOW_MS = float(os.getenv('LOAD_SHED_LATENCY_LOW_MS', 500))
+    LOAD_SHED_LATENCY_ALPHA = 0.3  # EWMA weight of the newest latency sample
+    LOAD_SHED_STEP_INTERVAL = float(os.getenv('LOAD_SHED_STEP_INTERVAL', 2))
+    LOAD_SHED_COOLDOWN = float(os.getenv('LOAD_SHED_COOLDOWN', 15))
     
     # File Storage
     UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', 'uploads')
     PROCESSED_FOLDER = os.getenv('PROCESSED_FOLDER', 'static')
+    ANNOTATED_JPEG_QUALITY = int(os.getenv('ANNOTATED_JPEG_QUALITY', 85))
+    
+    # Upload Limits (checked before any image is decoded)
+    MAX_UPLOAD_MB = int(os.getenv('MAX_UPLOAD_MB', 64))  # whole request
+    MAX_FILE_MB = int(os.getenv('MAX_FILE_MB', 25))
+    MAX_IMAGE_MEGAPIXELS = float(os.getenv('MAX_IMAGE_MEGAPIXELS', 100))
+    UPLOAD_DECODE_BUDGET_MB = int(os.getenv('UPLOAD_DECODE_BUDGET_MB', 256))  # decoded bitmaps per request; 0 disables
+    
+    # Stored Image Encoding (jpeg, webp or png)
+    IMAGE_FORMAT = os.getenv('IMAGE_FORMAT', 'webp').lower()
+    IMAGE_QUALITY = int(os.getenv('IMAGE_QUALITY', 80))
+    IMAGE_MAX_DIMENSION = int(os.getenv('IMAGE_MAX_DIMENSION', 1920))  # 0 keeps full size
+    THUMBNAIL_QUALITY = int(os.getenv('THUMBNAIL_QUALITY', 70))
+    # Thumbnail pyramid as name:max_dimension pairs
+    THUMBNAIL_SIZES = {
+        name.strip(): int(size)
+        for name, size in (item.split(':') for item in os.getenv('THUMBNAIL_SIZES', 'medium:480,small:160').split(',') if item.strip())
+    }
+    
+    # Storage Retention (TTL of 0 keeps data forever)
+    RETENTION_ENABLED = os.getenv('RETENTION_ENABLED', 'True').lower() == 'true'
+    RETENTION_INTERVAL = int(os.getenv('RETENTION_INTERVAL', 300))  # seconds between sweeps
+    RAW_FRAME_TTL_HOURS = float(os.getenv('RAW_FRAME_TTL_HOURS', 24))
+    ANNOTATED_TTL_HOURS = float(os.getenv('ANNOTATED_TTL_HOURS', 168))
+    RECORD_TTL_DAYS = float(os.getenv('RECORD_TTL_DAYS', 0))
+    DISK_QUOTA_MB = int(os.getenv('DISK_QUOTA_MB', 2048))  # uploads + processed folders
+    COMPACTION_INTERVAL = int(os.getenv('COMPACTION_INTERVAL', 3600))
+    COMPACTION_BATCH_SIZE = int(os.getenv('COMPACTION_BATCH_SIZE', 500))
+    COMPACTION_BATCH_PAUSE = float(os.getenv('COMPACTION_BATCH_PAUSE', 0.5))
+    COMPACTION_GRACE_MINUTES = int(os.getenv('COMPACTION_GRACE_MINUTES', 10))
+    
+    # Historical Backfill (backfill.py)
+    BACKFILL_BATCH_SIZE = int(os.getenv('BACKFILL_BATCH_SIZE', 16))  # frames per detection call and insert
+    BACKFILL_STATE_FOLDER = os.getenv('BACKFILL_STATE_FOLDER', os.path.join('data', 'backfill'))
+    
+    # Read API Response Cache (TTLs in seconds; 0 disables caching for an endpoint)
+    CACHE_ENABLED = os.getenv('CACHE_ENABLED', 'True').lower() == 'true'
+    CACHE_TTL_STATS = float(os.getenv('CACHE_TTL_STATS', 30))
+    CACHE_TTL_TRENDS = float(os.getenv('CACHE_TTL_TRENDS', 60))
+    CACHE_TTL_HISTORY = float(os.getenv('CACHE_TTL_HISTORY', 30))
+    CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 256))
+    CACHE_FLIGHT_TIMEOUT = float(os.getenv('CACHE_FLIGHT_TIMEOUT', 30))  # max wait for another request's query
     
     # Traffic Signal Timing (seconds)
     BASE_SIGNAL_DURATION = int(os.getenv('BASE_SIGNAL_DURATION', 20))
     EMERGENCY_MIN_DURATION = int(os.getenv('EMERGENCY_MIN_DURATION', 45))
     
+    # Demand Forecasting (per lane and hour of week)
+    FORECAST_WEIGHT = float(os.getenv('FORECAST_WEIGHT', 0.5))  # share of predicted vs current count; 0 disables
+    FORECAST_SEED_DAYS = int(os.getenv('FORECAST_SEED_DAYS', 28))  # history used to seed baselines; 0 disables
+    FORECAST_SEASONAL_ALPHA = float(os.getenv('FORECAST_SEASONAL_ALPHA', 0.1))
+    FORECAST_LEVEL_ALPHA = float(os.getenv('FORECAST_LEVEL_ALPHA', 0.3))
+    FORECAST_LEVEL_HALF_LIFE_MINUTES = float(os.getenv('FORECAST_LEVEL_HALF_LIFE_MINUTES', 30))
+    FORECAST_PRIOR_WEIGHT = float(os.getenv('FORECAST_PRIOR_WEIGHT', 2))  # pseudo-observations of the lane mean per slot
+    FORECAST_SEED_RETRY_INTERVAL = float(os.getenv('FORECAST_SEED_RETRY_INTERVAL', 30))  # seconds between seeding attempts while storage is down
+    
     # Vehicle Detection
     VEHICLE_CLASSES = [2, 3, 5, 7]  # COCO classes: car, motorcycle, bus, truck
+    VEHICLE_CLASS_NAMES = {2: 'car', 3: 'motorcycle', 5: 'bus', 7: 'truck'}
     EMERGENCY_COLOR_THRESHOLD = 0.01  # 1% of image
     
+    # Storage Backend ('mongo' or 'sqlite')
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'mongo').lower()
+    
+    # Embedded SQLite Backend
+    SQLITE_PATH = os.getenv('SQLITE_PATH', os.path.join('data', 'trafficiq.db'))
+    IMAGE_STORE_FOLDER = os.getenv('IMAGE_STORE_FOLDER', os.path.join('data', 'images'))
+    SQLITE_BATCH_SIZE = int(os.getenv('SQLITE_BATCH_SIZE', 50))
+    SQLITE_FLUSH_INTERVAL = float(os.getenv('SQLITE_FLUSH_INTERVAL', 1.0))  # seconds
+    PARQUET_EXPORT_FOLDER = os.getenv('PARQUET_EXPORT_FOLDER', os.path.join('data', 'parquet'))
+    PARQUET_EXPORT_INTERVAL = int(os.getenv('PARQUET_EXPORT_INTERVAL', 3600))  # 0 disables
+    
     # MongoDB Configuration
     MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017')
     MONGODB_DB_NAME = os.getenv('MONGODB_DB_NAME', 'trafficiq')
+    MONGODB_MAX_POOL_SIZE = int(os.getenv('MONGODB_MAX_POOL_SIZE', 50))
+    MONGODB_MIN_POOL_SIZE = int(os.getenv('MONGODB_MIN_POOL_SIZE', 2))
+    MONGODB_MAX_IDLE_TIME_MS = int(os.getenv('MONGODB_MAX_IDLE_TIME_MS', 60000))
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGODB_WAIT_QUEUE_TIMEOUT_MS', 2000))
+    MONGODB_CONNECT_TIMEOUT_MS = int(os.getenv('MONGODB_CONNECT_TIMEOUT_MS', 2000))
+    MONGODB_SOCKET_TIMEOUT_MS = int(os.getenv('MONGODB_SOCKET_TIMEOUT_MS', 10000))
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGODB_SERVER_SELECTION_TIMEOUT_MS', 2000))
+    
+    # Database Circuit Breaker and Outage Journal
+    DB_BREAKER_FAILURE_THRESHOLD = int(os.getenv('DB_BREAKER_FAILURE_THRESHOLD', 2))
+    DB_BREAKER_FAILURE_WINDOW = float(os.getenv('DB_BREAKER_FAILURE_WINDOW', 30))  # seconds
+    DB_BREAKER_PROBE_INTERVAL = float(os.getenv('DB_BREAKER_PROBE_INTERVAL', 5))  # seconds
+    DB_JOURNAL_ENABLED = os.getenv('DB_JOURNAL_ENABLED', 'True').lower() == 'true'
+    DB_JOURNAL_FOLDER = os.getenv('DB_JOURNAL_FOLDER', os.path.join('data', 'journal'))
+    DB_JOURNAL_MAX_ENTRIES = int(os.getenv('DB_JOURNAL_MAX_ENTRIES', 10000))
+    DB_JOURNAL_MAX_ATTEMPTS = int(os.getenv('DB_JOURNAL_MAX_ATTEMPTS', 5))
+    DB_JOURNAL_REPLAY_INTERVAL = float(os.getenv('DB_JOURNAL_REPLAY_INTERVAL', 30))  # seconds
+    DB_JOURNAL_CLAIM_TIMEOUT = float(os.getenv('DB_JOURNAL_CLAIM_TIMEOUT', 300))  # seconds
     
     @classmethod
     def get_model_path(cls, model_name: str) -> str:
@@ -1,131 +1,115 @@
 """
-TrafficIQ Database Module - MongoDB Integration
-================================================
-Handles all database operations including:
-- Traffic record storage
-- Image storage via GridFS
+TrafficIQ Database Module
+=========================
+Storage API used by the application. Handles:
+- Traffic record storage (single and bulk)
+- Image storage (GridFS or content-addressed files)
 - Trends aggregation
 - Historical data queries
+- Retention: image expiry and orphan compaction
+
+Calls are delegated to the backend selected by Config.STORAGE_BACKEND
+('mongo' or 'sqlite'); see the storage package. Every write that changes
+what the read APIs return invalidates the response cache.
 """
 
-import os
-import logging
 from datetime import datetime, timedelta
-from typing import Dict, Any, List, Optional
-from bson import ObjectId
-
-logger = logging.getLogger('TrafficIQ.Database')
+from typing import Dict, Any, List, Optional, Tuple
 
-# MongoDB connection - initialized on demand
-_client = None
-_db = None
-_fs = None
+from config import config
+from cache import response_cache
+from storage import add_write_listener, get_backend, spill_journal
 
-
-def get_connection():
-    """Get or create MongoDB connection."""
-    global _client, _db, _fs
-    
-    if _client is None:
-        try:
-            from pymongo import MongoClient
-            import gridfs
-            
-            mongo_uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017')
-            db_name = os.getenv('MONGODB_DB_NAME', 'trafficiq')
-            
-            _client = MongoClient(mongo_uri, serverSelectionTimeoutMS=5000)
-            # Test connection
-            _client.admin.command('ping')
-            
-            _db = _client[db_name]
-            _fs = gridfs.GridFS(_db)
-            
-            logger.info(f"Connected to MongoDB: {db_name}")
-            
-            # Create indexes
-            _db.traffic_records.create_index([("created_at", -1)])
-            _db.traffic_records.create_index([("direction", 1)])
-            _db.traffic_records.create_index([("direction", 1), ("created_at", -1)])
-            
-        except Exception as e:
-            logger.error(f"MongoDB connection failed: {e}")
-            raise
-    
-    return _db, _fs
+# Replayed records, and queued records once they commit, change what the read APIs return
+spill_journal.add_listener(lambda replayed: response_cache.invalidate())
+add_write_listener(response_cache.invalidate)
 
 
 def save_traffic_record(
     direction: str,
     vehicle_count: int,
     original_image_path: str,
-    processed_image_path: str
+    detections: Optional[List[Dict[str, Any]]] = None,
+    image_size: Optional[List[int]] = None,
+    model: Optional[str] = None,
+    created_at: Optional[datetime] = None
 ) -> Optional[str]:
     """
-    Save a traffic record with images to MongoDB.
+    Save a traffic record with its original image.
+    
+    The image is re-encoded with the configured format, quality and max
+    dimension, and a thumbnail pyramid is stored alongside it. Annotated
+    images are not stored; they are rendered on demand from the original
+    image and the structured detections.
+    
+    If the backend is unavailable or the save fails, the record is spilled
+    to the local journal instead. The journal is replayed when the backend
+    recovers and, at most every DB_JOURNAL_REPLAY_INTERVAL seconds, after
+    later successful saves.
     
     Args:
         direction: Traffic direction (north, east, south, west)
         vehicle_count: Number of vehicles detected
         original_image_path: Path to original uploaded image
-        processed_image_path: Path to processed image with annotations
+        detections: Detected boxes, classes and confidences
+        image_size: Original image size as [width, height]
+        model: Model ladder level that produced the count, e.g. 'yolov8n.pt@416'
+        created_at: Capture time; defaults to now
     
     Returns:
-        Record ID as string, or None if failed
+        Record ID as string, or None if failed or journaled
     """
-    try:
-        db, fs = get_connection()
-        
-        # Store images in GridFS
-        original_image_id = None
-        processed_image_id = None
-        
-        if os.path.exists(original_image_path):
-            with open(original_image_path, 'rb') as f:
-                original_image_id = fs.put(
-                    f.read(),
-                    filename=os.path.basename(original_image_path),
-                    content_type='image/jpeg',
-                    direction=direction
-                )
-        
-        if os.path.exists(processed_image_path):
-            with open(processed_image_path, 'rb') as f:
-                processed_image_id = fs.put(
-                    f.read(),
-                    filename=os.path.basename(processed_image_path),
-                    content_type='image/jpeg',
-                    direction=direction
-                )
-        
-        # Create traffic record
-        record = {
-            'direction': direction,
-            'vehicle_count': vehicle_count,
-            'original_image_id': original_image_id,
-            'processed_image_id': processed_image_id,
-            'created_at': datetime.utcnow()
-        }
-        
-        result = db.traffic_records.insert_one(record)
-        logger.info(f"Saved traffic record: {direction} - {vehicle_count} vehicles")
-        
-        return str(result.inserted_id)
-        
-    except Exception as e:
-        logger.error(f"Failed to save traffic record: {e}")
-        return None
-
-
-def get_image(image_id: str) -> Optional[bytes]:
-    """Get image data from GridFS by ID."""
-    try:
-        db, fs = get_connection()
-        grid_out = fs.get(ObjectId(image_id))
-        return grid_out.read()
-    except Exception as e:
-        logger.error(f"Failed to get image {image_id}: {e}")
-        return None
+    backend = get_backend()
+    created_at = created_at or datetime.utcnow()
+    
+    if backend.available():
+        record_id = backend.save_traffic_record(
+            direction, vehicle_count, original_image_path,
+            detections=detections, image_size=image_size, model=model, created_at=created_at
+        )
+        if record_id:
+            response_cache.invalidate()
+            # Records journaled after a failed save while the breaker stayed closed
+            spill_journal.replay_async(backend, min_interval=config.DB_JOURNAL_REPLAY_INTERVAL)
+            return record_id
+    
+    if config.DB_JOURNAL_ENABLED:
+        spill_journal.append(
+            direction, vehicle_count, original_image_path,
+            detections=detections, image_size=image_size, model=model, created_at=created_at
+        )
+    return None
+
+
+def save_traffic_records(records: List[Dict[str, Any]]) -> List[str]:
+    """
+    Save many traffic records with one bulk insert (used by backfill).
+    
+    Each item holds the save_traffic_record keyword arguments plus an
+    optional 'record_id' (24 hex digits). Records whose ID is already
+    stored are skipped, so callers can safely retry a whole batch after a
+    partial write or a crash. Records are not journaled on failure.
+    
+    Returns:
+        Record IDs in input order, or an empty list if the batch failed
+    """
+    backend = get_backend()
+    if not backend.available():
+        return []
+    record_ids = backend.save_traffic_records(records)
+    if record_ids:
+        response_cache.invalidate()
+    return record_ids
+
+
+def get_record(record_id: str) -> Optional[Dict[str, Any]]:
+    """Get a single traffic record by ID."""
+    return get_backend().get_record(record_id)
+
+
+def get_image(image_id: str) -> Optional[Tuple[bytes, str]]:
+    """Get image data and content type by ID."""
+    return get_backend().get_image(image_id)
 
 
 def get_history(
@@ -140,49 +124,10 @@ def get_history(
     
     Returns dict with 'records', 'total', 'page', 'pages'
     """
-    try:
-        db, fs = get_connection()
-        
-        # Build query
-        query = {}
-        if direction:
-            query['direction'] = direction
-        if start_date or end_date:
-            query['created_at'] = {}
-            if start_date:
-                query['created_at']['$gte'] = start_date
-            if end_date:
-                query['created_at']['$lte'] = end_date
-        
-        # Count total
-        total = db.traffic_records.count_documents(query)
-        pages = (total + per_page - 1) // per_page
-        
-        # Get records
-        skip = (page - 1) * per_page
-        cursor = db.traffic_records.find(query).sort('created_at', -1).skip(skip).limit(per_page)
-        
-        records = []
-        for doc in cursor:
-            records.append({
-                'id': str(doc['_id']),
-                'direction': doc['direction'],
-                'vehicle_count': doc['vehicle_count'],
-                'original_image_id': str(doc.get('original_image_id', '')),
-                'processed_image_id': str(doc.get('processed_image_id', '')),
-                'created_at': doc['created_at'].isoformat()
-            })
-        
-        return {
-            'records': records,
-            'total': total,
-            'page': page,
-            'pages': pages
-        }
-        
-    except Exception as e:
-        logger.error(f"Failed to get history: {e}")
-        return {'records': [], 'total': 0, 'page': 1, 'pages': 0}
+    return get_backend().get_history(
+        direction=direction, page=page, per_page=per_page,
+        start_date=start_date, end_date=end_date
+    )
 
 
 def get_trends(period: str = 'hourly', days: int = 7) -> List[Dict[str, Any]]:
@@ -193,120 +138,95 @@ def get_trends(period: str = 'hourly', days: int = 7) -> List[Dict[str, Any]]:
         period: 'hourly' or 'daily'
         days: Number of days to look back
     """
-    try:
-        db, fs = get_connection()
-        
-        start_date = datetime.utcnow() - timedelta(days=days)
-        
-        # Date grouping format
-        if period == 'daily':
-            date_format = '%Y-%m-%d'
-            group_id = {
-                'direction': '$direction',
-                'date': {'$dateToString': {'format': date_format, 'date': '$created_at'}}
-            }
-        else:  # hourly
-            date_format = '%Y-%m-%d %H:00'
-            group_id = {
-                'direction': '$direction',
-                'date': {'$dateToString': {'format': '%Y-%m-%dT%H:00:00', 'date': '$created_at'}}
-            }
-        
-        pipeline = [
-            {'$match': {'created_at': {'$gte': start_date}}},
-            {'$group': {
-                '_id': group_id,
-                'avg_count': {'$avg': '$vehicle_count'},
-                'max_count': {'$max': '$vehicle_count'},
-                'min_count': {'$min': '$vehicle_count'},
-                'total_records': {'$sum': 1}
-            }},
-            {'$sort': {'_id.date': 1}}
-        ]
-        
-        results = list(db.traffic_records.aggregate(pipeline))
-        
-        trends = []
-        for doc in results:
-            trends.append({
-                'direction': doc['_id']['direction'],
-                'period': doc['_id']['date'],
-                'avg_count': round(doc['avg_count'], 1),
-                'max_count': doc['max_count'],
-                'min_count': doc['min_count'],
-                'total_records': doc['total_records']
-            })
-        
-        return trends
-        
-    except Exception as e:
-        logger.error(f"Failed to get trends: {e}")
-        return []
+    return get_backend().get_trends(period=period, days=days)
 
 
 def get_stats() -> Dict[str, Any]:
     """Get summary statistics."""
+    return get_backend().get_stats()
+
+
+def get_counts_since(since: datetime) -> List[Tuple[str, datetime, int]]:
+    """Get (direction, created_at, vehicle_count) for every record since a time, oldest first."""
+    return get_backend().get_counts_since(since)
+
+
+def expire_record_images(
+    field: str,
+    older_than: datetime,
+    batch_size: int = 500
+) -> Dict[str, int]:
+    """
+    Delete one image tier from records created before a cutoff.
+    
+    The record is kept; the image reference is cleared so it is not
+    expired twice.
+    
+    Args:
+        field: Record field holding the image ID ('original_image_id' or 'processed_image_id')
+        older_than: Only records created before this time are touched
+        batch_size: Records handled per round trip
+    
+    Returns:
+        Dict with 'files' deleted and 'bytes' reclaimed
+    """
+    result = get_backend().expire_record_images(field, older_than, batch_size)
+    if result['files']:
+        response_cache.invalidate()
+    return result
+
+
+def delete_records_before(older_than: datetime) -> int:
+    """Delete records created before a cutoff; their images are left for compaction."""
+    deleted = get_backend().delete_records_before(older_than)
+    if deleted:
+        response_cache.invalidate()
+    return deleted
+
+
+def purge_orphaned_images(
+    after_id: Optional[Any] = None,
+    batch_size: int = 500,
+    grace_period: timedelta = timedelta(minutes=10)
+) -> Dict[str, Any]:
+    """
+    Scan one batch of stored images and delete those no record references.
+    
+    Images are scanned in ID order so callers can resume from 'last_id'.
+    Images newer than the grace period are skipped, since an upload stores
+    its images before the record that references them is written.
+    
+    Returns:
+        Dict with 'scanned', 'purged', 'bytes' and 'last_id' (None when done)
+    """
+    return get_backend().purge_orphaned_images(after_id, batch_size, grace_period)
+
+
+def available() -> bool:
+    """Whether storage calls are being attempted; False while the circuit breaker is open."""
     try:
-        db, fs = get_connection()
-        
-        # Total records
-        total_records = db.traffic_records.count_documents({})
-        
-        # Records today
-        today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        today_records = db.traffic_records.count_documents({'created_at': {'$gte': today_start}})
-        
-        # Stats by direction
-        pipeline = [
-            {'$group': {
-                '_id': '$direction',
-                'total_vehicles': {'$sum': '$vehicle_count'},
-                'avg_vehicles': {'$avg': '$vehicle_count'},
-                'record_count': {'$sum': 1}
-            }}
-        ]
-        direction_stats = {doc['_id']: {
-            'total_vehicles': doc['total_vehicles'],
-            'avg_vehicles': round(doc['avg_vehicles'], 1),
-            'record_count': doc['record_count']
-        } for doc in db.traffic_records.aggregate(pipeline)}
-        
-        # Peak hours (last 7 days)
-        week_ago = datetime.utcnow() - timedelta(days=7)
-        peak_pipeline = [
-            {'$match': {'created_at': {'$gte': week_ago}}},
-            {'$group': {
-                '_id': {'$hour': '$created_at'},
-                'avg_vehicles': {'$avg': '$vehicle_count'}
-            }},
-            {'$sort': {'avg_vehicles': -1}},
-            {'$limit': 3}
-        ]
-        peak_hours = [doc['_id'] for doc in db.traffic_records.aggregate(peak_pipeline)]
-        
-        return {
-            'total_records': total_records,
-            'today_records': today_records,
-            'by_direction': direction_stats,
-            'peak_hours': peak_hours,
-            'last_updated': datetime.utcnow().isoformat()
-        }
-        
-    except Exception as e:
-        logger.error(f"Failed to get stats: {e}")
-        return {
-            'total_records': 0,
-            'today_records': 0,
-            'by_direction': {},
-            'peak_hours': [],
-            'last_updated': datetime.utcnow().isoformat()
-        }
+        return get_backend().available()
+    except Exception:
+        return False
 
 
 def check_connection() -> bool:
-    """Check if MongoDB is connected and working."""
+    """Check if the storage backend is connected and working."""
     try:
-        db, fs = get_connection()
-        return True
-    except:
+        return get_backend().check_connection()
+    except Exception:
         return False
+
+
+def status() -> Dict[str, Any]:
+    """Storage health: backend state, circuit breaker and spill journal."""
+    return {
+        'backend': config.STORAGE_BACKEND,
+        **get_backend().status(),
+        'journal': spill_journal.status()
+    }
+
+
+def close():
+    """Flush pending writes and release storage resources."""
+    get_backend().close()
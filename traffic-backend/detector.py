@@ -0,0 +1,231 @@
+"""
+TrafficIQ Detector Module - Adaptive YOLO Model Pool
+=====================================================
+Keeps several YOLO models loaded and sheds load by stepping down
+a ladder of (model, input size) levels under backpressure:
+- Steps down when in-flight requests or recent latency exceed limits
+- Steps back up after a sustained idle period
+- Tags every detection with the level that produced it
+"""
+
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, List
+
+from config import config
+
+logger = logging.getLogger('TrafficIQ.Detector')
+
+
+class ModelLevel:
+    """One rung of the load-shedding ladder: a model file at an input size."""
+
+    def __init__(self, name: str, imgsz: int, model, lock: threading.Lock):
+        self.name = name
+        self.imgsz = imgsz
+        self.model = model
+        self._lock = lock
+
+    @property
+    def tag(self) -> str:
+        """Identifier recorded alongside every count, e.g. 'yolov8n.pt@416'."""
+        return f"{self.name}@{self.imgsz}"
+
+    def predict(self, source, **kwargs):
+        """Run inference; models sharing a file are serialized on one lock."""
+        with self._lock:
+            return self.model(source, imgsz=self.imgsz, verbose=False, **kwargs)
+
+
+def parse_ladder(spec: str) -> List[tuple]:
+    """Parse 'yolov8s.pt@640,yolov8n.pt@416' into [(name, imgsz), ...]."""
+    ladder = []
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, size = item.partition('@')
+        ladder.append((name.strip(), int(size) if size else config.MODEL_INPUT_SIZE))
+    return ladder
+
+
+def default_ladder() -> List[tuple]:
+    """
+    Preferred model first, then the smaller fallbacks, at full input size.
+
+    Reduced input sizes are added by ModelPool.load once it knows which of
+    these files actually exist.
+    """
+    names = []
+    for name in [config.PREFERRED_MODEL, 'yolov8s.pt', 'yolov8n.pt']:
+        if name not in names:
+            names.append(name)
+    return [(name, config.MODEL_INPUT_SIZE) for name in names]
+
+
+class ModelPool:
+    """Thread-safe pool of loaded models with backpressure-driven level selection."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.levels: List[ModelLevel] = []
+        self._index = 0
+        self._inflight = 0
+        self._latency_ewma = None
+        self._last_change = 0.0
+        self._calm_since = None
+        self._last_release = 0.0
+        self._served = {}
+
+    @property
+    def is_loaded(self) -> bool:
+        return bool(self.levels)
+
+    def load(self) -> bool:
+        """
+        Load every model on the ladder that exists in the models folder.
+
+        With the default ladder, the smallest model that loaded is repeated
+        at each of MODEL_REDUCED_INPUT_SIZES, so there is always a cheaper
+        level to step down to.
+        """
+        try:
+            from ultralytics import YOLO
+        except Exception as e:
+            logger.error(f"Failed to load YOLO model: {e}")
+            return False
+
+        ladder = parse_ladder(config.MODEL_LADDER) if config.MODEL_LADDER else default_ladder()
+        loaded = {}
+        levels = []
+
+        def add_level(name: str, imgsz: int):
+            model, lock = loaded[name]
+            if not any(level.name == name and level.imgsz == imgsz for level in levels):
+                levels.append(ModelLevel(name, imgsz, model, lock))
+
+        for name, imgsz in ladder:
+            model_path = config.get_model_path(name)
+            if name not in loaded:
+                if not os.path.exists(model_path):
+                    continue
+                try:
+                    loaded[name] = (YOLO(model_path), threading.Lock())
+                    logger.info(f"YOLO model loaded: {model_path}")
+                except Exception as e:
+                    logger.error(f"Failed to load YOLO model {model_path}: {e}")
+                    continue
+            add_level(name, imgsz)
+
+        if not levels:
+            logger.warning("No YOLO model found in models folder. Vehicle detection disabled.")
+            return False
+
+        if not config.MODEL_LADDER:
+            smallest = levels[-1].name
+            for size in config.MODEL_REDUCED_INPUT_SIZES:
+                add_level(smallest, size)
+
+        with self._lock:
+            self.levels = levels
+            self._index = 0
+        logger.info(f"Model ladder: {' > '.join(level.tag for level in levels)}")
+        return True
+
+    @property
+    def top(self) -> ModelLevel:
+        """Highest-quality level, for offline work that should not be shed."""
+        return self.levels[0]
+
+    @property
+    def max_input_size(self) -> int:
+        """Largest input size on the ladder; frames are decoded at least this large."""
+        return max((level.imgsz for level in self.levels), default=config.MODEL_INPUT_SIZE)
+
+    def _shift(self, step: int, reason: str):
+        """Move along the ladder; caller holds the lock."""
+        new_index = min(max(self._index + step, 0), len(self.levels) - 1)
+        if new_index == self._index:
+            return
+        old = self.levels[self._index].tag
+        self._index = new_index
+        self._last_change = time.time()
+        self._calm_since = None
+        logger.info(f"Load shedding: {old} -> {self.levels[new_index].tag} ({reason})")
+
+    def _adjust(self):
+        """Re-evaluate the active level from queue depth and recent latency."""
+        if not config.LOAD_SHED_ENABLED or len(self.levels) < 2:
+            return
+
+        now = time.time()
+        latency_ms = (self._latency_ewma or 0.0) * 1000
+        overloaded = (self._inflight >= config.LOAD_SHED_QUEUE_HIGH or
+                      latency_ms > config.LOAD_SHED_LATENCY_HIGH_MS)
+        calm = (self._inflight <= config.LOAD_SHED_QUEUE_LOW and
+                latency_ms < config.LOAD_SHED_LATENCY_LOW_MS)
+
+        if overloaded:
+            self._calm_since = None
+            if now - self._last_change >= config.LOAD_SHED_STEP_INTERVAL:
+                reason = f"inflight={self._inflight}, latency={latency_ms:.0f}ms"
+                self._shift(1, reason)
+        elif calm and self._index > 0:
+            if self._calm_since is None:
+                self._calm_since = now
+            elif now - self._calm_since >= config.LOAD_SHED_COOLDOWN:
+                self._shift(-1, f"idle for {config.LOAD_SHED_COOLDOWN}s")
+        else:
+            self._calm_since = None
+
+    @contextmanager
+    def acquire(self):
+        """
+        Reserve a level for one detection.
+
+        Yields the ModelLevel to use; latency of the block (including time
+        queued on the model lock) feeds the next level decision.
+        """
+        if not self.levels:
+            raise ValueError("YOLO model not loaded. Please ensure model files are in the models folder.")
+
+        with self._lock:
+            self._inflight += 1
+            # Latency samples from a burst that ended long ago say nothing
+            # about current load; let an idle server climb back up.
+            if self._inflight == 1 and time.time() - self._last_release >= config.LOAD_SHED_COOLDOWN:
+                self._latency_ewma = None
+                if self._calm_since is None:
+                    self._calm_since = self._last_release
+            self._adjust()
+            level = self.levels[self._index]
+
+        started = time.time()
+        try:
+            yield level
+        finally:
+            elapsed = time.time() - started
+            with self._lock:
+                self._inflight -= 1
+                self._last_release = time.time()
+                alpha = config.LOAD_SHED_LATENCY_ALPHA
+                self._latency_ewma = elapsed if self._latency_ewma is None else (
+                    alpha * elapsed + (1 - alpha) * self._latency_ewma)
+                self._served[level.tag] = self._served.get(level.tag, 0) + 1
+
+    def status(self) -> Dict[str, Any]:
+        """Snapshot of the ladder for health reporting."""
+        with self._lock:
+            return {
+                'active': self.levels[self._index].tag if self.levels else None,
+                'ladder': [level.tag for level in self.levels],
+                'inflight': self._inflight,
+                'latency_ms': round(self._latency_ewma * 1000, 1) if self._latency_ewma is not None else None,
+                'served': dict(self._served)
+            }
+
+
+model_pool = ModelPool()
@@ -0,0 +1,231 @@
+"""
+TrafficIQ Imaging Module
+========================
+Image helpers shared by the API:
+- Converting YOLO results into structured detections
+- Rendering detection overlays on demand
+- Encoding stored frames and their thumbnail pyramid
+- Header probing and reduced-resolution decoding of large frames
+"""
+
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from config import config
+
+logger = logging.getLogger('TrafficIQ.Imaging')
+
+
+def extract_detections(result, scale: float = 1.0) -> List[Dict[str, Any]]:
+    """
+    Convert one YOLO result into JSON-serializable vehicle detections.
+
+    Each detection is {'box': [x1, y1, x2, y2], 'class_id', 'label', 'confidence'}
+    in original image pixel coordinates; scale maps boxes from a frame
+    decoded at reduced resolution back to the original.
+    """
+    if result is None or not result.boxes:
+        return []
+
+    data = result.boxes.data.cpu().numpy()
+    if data.size == 0:
+        return []
+
+    # Filter by vehicle classes (car, motorcycle, bus, truck)
+    data = data[np.isin(data[:, 5].astype(int), config.VEHICLE_CLASSES)]
+
+    boxes = np.round(data[:, :4] * scale).astype(int).tolist()
+    confidences = np.round(data[:, 4].astype(float), 3).tolist()
+    class_ids = data[:, 5].astype(int).tolist()
+
+    return [
+        {
+            'box': box,
+            'class_id': class_id,
+            'label': config.VEHICLE_CLASS_NAMES.get(class_id, 'vehicle'),
+            'confidence': confidence
+        }
+        for box, class_id, confidence in zip(boxes, class_ids, confidences)
+    ]
+
+
+def render_detections(image: np.ndarray, detections: List[Dict[str, Any]],
+                      scale: float = 1.0) -> np.ndarray:
+    """Draw detection boxes and labels onto an image in place."""
+    for detection in detections:
+        x1, y1, x2, y2 = (int(v * scale) for v in detection['box'])
+        conf = detection['confidence']
+
+        # Color based on confidence
+        color = (0, 255, 0) if conf > 0.7 else (0, 255, 255)
+        cv2.rectangle(image, (x1, y1), (x2, y2), color, 2)
+
+        label = f"{detection.get('label', 'vehicle').title()} {conf:.0%}"
+        cv2.putText(image, label, (x1, max(y1 - 10, 10)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+
+    return image
+
+
+def render_annotated(image_data: bytes, detections: List[Dict[str, Any]],
+                     image_size: Optional[List[int]] = None) -> Optional[bytes]:
+    """
+    Decode an encoded frame, draw its detections and re-encode as JPEG.
+
+    image_size is the [width, height] the detections were measured on;
+    boxes are scaled when the stored frame was downsized at save time.
+    """
+    image = cv2.imdecode(np.frombuffer(image_data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        logger.error("Failed to decode image for annotation")
+        return None
+
+    scale = image.shape[1] / image_size[0] if image_size and image_size[0] else 1.0
+    render_detections(image, detections, scale)
+    ok, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, config.ANNOTATED_JPEG_QUALITY])
+    return buffer.tobytes() if ok else None
+
+
+# ============================================================================
+# REDUCED-RESOLUTION DECODING
+# ============================================================================
+
+# Scale denominator -> imread flag. JPEG is downscaled inside libjpeg, so the
+# full-resolution bitmap is never allocated; other formats are decoded in
+# full and then resized.
+REDUCED_DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+def probe_image(path: str) -> Optional[Dict[str, Any]]:
+    """
+    Read an image's format and size from its header without decoding pixels.
+
+    Returns {'format', 'width', 'height'}, or None if the file is not an
+    image. Raises ValueError for images past Pillow's decompression-bomb limit.
+    """
+    try:
+        with Image.open(path) as image:
+            return {
+                'format': (image.format or '').lower(),
+                'width': image.width,
+                'height': image.height
+            }
+    except Image.DecompressionBombError as e:
+        raise ValueError(str(e))
+    except Exception:
+        return None
+
+
+def reduced_decode_factor(width: int, height: int, target: int) -> int:
+    """Largest IMREAD_REDUCED factor that keeps the longest side at least target pixels."""
+    longest = max(width, height)
+    factor = 1
+    while factor < 8 and target and longest // (factor * 2) >= target:
+        factor *= 2
+    return factor
+
+
+def decoded_bytes(probe: Dict[str, Any], target: int) -> int:
+    """Peak bitmap memory for decoding an image for a target size with load_reduced."""
+    width, height = probe['width'], probe['height']
+    factor = reduced_decode_factor(width, height, target) if probe['format'] == 'jpeg' else 1
+    return -(-width // factor) * -(-height // factor) * 3
+
+
+def load_reduced(path: str, target: int) -> Tuple[Optional[np.ndarray], float]:
+    """
+    Decode an image at the smallest reduced resolution that still covers target.
+
+    Returns the BGR image and the scale mapping its pixel coordinates back
+    to the original resolution, or (None, 1.0) if it cannot be decoded.
+    """
+    try:
+        probe = probe_image(path)
+    except ValueError as e:
+        logger.error(f"Refusing to decode {path}: {e}")
+        return None, 1.0
+    factor = reduced_decode_factor(probe['width'], probe['height'], target) if probe else 1
+    image = cv2.imread(path, REDUCED_DECODE_FLAGS[factor])
+    if image is None:
+        return None, 1.0
+    if not probe:
+        return image, 1.0
+    return image, max(probe['width'], probe['height']) / max(image.shape[:2])
+
+
+# ============================================================================
+# STORED IMAGE ENCODING
+# ============================================================================
+
+IMAGE_FORMATS = {
+    'jpeg': ('.jpg', 'image/jpeg', cv2.IMWRITE_JPEG_QUALITY),
+    'webp': ('.webp', 'image/webp', cv2.IMWRITE_WEBP_QUALITY),
+    'png': ('.png', 'image/png', None),
+}
+
+
+def resize_to_fit(image: np.ndarray, max_dimension: int) -> np.ndarray:
+    """Downscale so the longest side is at most max_dimension; never upscales."""
+    height, width = image.shape[:2]
+    longest = max(height, width)
+    if not max_dimension or longest <= max_dimension:
+        return image
+
+    factor = max_dimension / longest
+    size = (max(1, round(width * factor)), max(1, round(height * factor)))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+
+def encode_image(image: np.ndarray, fmt: str, quality: int) -> Optional[bytes]:
+    """Encode an image in one of IMAGE_FORMATS."""
+    ext, _, quality_flag = IMAGE_FORMATS[fmt]
+    params = [quality_flag, quality] if quality_flag is not None else []
+    ok, buffer = cv2.imencode(ext, image, params)
+    return buffer.tobytes() if ok else None
+
+
+def build_renditions(image_path: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Encode a frame for storage plus its thumbnail pyramid.
+
+    The frame is decoded once, at reduced resolution when it is much larger
+    than IMAGE_MAX_DIMENSION; each thumbnail is downscaled from the next
+    larger level. Returns {'full' | <thumbnail name>: {'data', 'content_type',
+    'extension', 'width', 'height'}}, or an empty dict if decoding fails.
+    """
+    image, _ = load_reduced(image_path, config.IMAGE_MAX_DIMENSION)
+    if image is None:
+        logger.error(f"Failed to load image for encoding: {image_path}")
+        return {}
+
+    fmt = config.IMAGE_FORMAT if config.IMAGE_FORMAT in IMAGE_FORMATS else 'jpeg'
+    ext, content_type, _ = IMAGE_FORMATS[fmt]
+
+    levels = [('full', config.IMAGE_MAX_DIMENSION, config.IMAGE_QUALITY)]
+    for name, dimension in sorted(config.THUMBNAIL_SIZES.items(), key=lambda item: -item[1]):
+        levels.append((name, dimension, config.THUMBNAIL_QUALITY))
+
+    renditions = {}
+    for name, dimension, quality in levels:
+        image = resize_to_fit(image, dimension)
+        data = encode_image(image, fmt, quality)
+        if data is None:
+            logger.error(f"Failed to encode {name} rendition of {image_path}")
+            continue
+        renditions[name] = {
+            'data': data,
+            'content_type': content_type,
+            'extension': ext,
+            'width': image.shape[1],
+            'height': image.shape[0]
+        }
+
+    return renditions
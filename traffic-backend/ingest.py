@@ -0,0 +1,112 @@
+"""
+TrafficIQ Ingest Module
+=======================
+Upload admission, applied before any image is decoded:
+- Chunked saves to disk with a per-file byte limit
+- Header-only dimension checks against a pixel limit
+- Per-request accounting of the memory decoding will take
+"""
+
+import os
+import logging
+from typing import Dict, Any, Optional
+
+from config import config
+from detector import model_pool
+from imaging import probe_image, decoded_bytes
+
+logger = logging.getLogger('TrafficIQ.Ingest')
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class UploadRejected(Exception):
+    """An upload that exceeds a limit; carries the HTTP status to return."""
+
+    def __init__(self, message: str, status: int = 413):
+        super().__init__(message)
+        self.status = status
+
+
+def save_upload(file, path: str, max_bytes: int) -> int:
+    """
+    Copy an uploaded file to disk in chunks, stopping at max_bytes.
+
+    Werkzeug spools large multipart parts to temporary files, so neither
+    the parse nor the copy holds a whole image in memory. Returns the
+    number of bytes written; a partial file is removed on failure.
+    """
+    written = 0
+    try:
+        with open(path, 'wb') as out:
+            while True:
+                chunk = file.stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > max_bytes:
+                    raise UploadRejected(
+                        f"{file.filename} exceeds the {max_bytes // (1024 * 1024)} MB per-file limit"
+                    )
+                out.write(chunk)
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return written
+
+
+def decode_cost(probe: Dict[str, Any]) -> int:
+    """
+    Peak bitmap memory for processing one frame.
+
+    Detection and storage encoding decode the frame one after the other,
+    each at its own reduced resolution, so the cost is the larger of the two.
+    """
+    return max(
+        decoded_bytes(probe, model_pool.max_input_size),
+        decoded_bytes(probe, config.IMAGE_MAX_DIMENSION)
+    )
+
+
+class DecodeBudget:
+    """Running total of decode memory for one request, checked per file."""
+
+    def __init__(self, limit_bytes: int):
+        self.limit = limit_bytes
+        self.used = 0
+
+    def admit(self, path: str, name: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Check a saved upload from its header and charge its decode cost.
+
+        name is the client's file name, used in rejection messages.
+
+        Raises:
+            UploadRejected: 400 if the file is not an image, 413 if it has
+                too many pixels or would take the request over budget
+        """
+        name = name or os.path.basename(path)
+        try:
+            probe = probe_image(path)
+        except ValueError:
+            raise UploadRejected(f"{name} has too many pixels to decode safely")
+        if probe is None:
+            raise UploadRejected(f"{name} is not a supported image", status=400)
+
+        megapixels = probe['width'] * probe['height'] / 1e6
+        if megapixels > config.MAX_IMAGE_MEGAPIXELS:
+            raise UploadRejected(
+                f"{name} is {megapixels:.0f} MP; the limit is {config.MAX_IMAGE_MEGAPIXELS:g} MP"
+            )
+
+        cost = decode_cost(probe)
+        if self.limit and self.used + cost > self.limit:
+            raise UploadRejected(
+                f"Decoding this request needs more than the "
+                f"{self.limit // (1024 * 1024)} MB per-request budget; upload fewer or smaller images"
+            )
+        self.used += cost
+        logger.debug(f"Admitted {name}: {probe['width']}x{probe['height']} {probe['format']}, "
+                     f"{cost / 1e6:.1f} MB to decode ({self.used / 1e6:.1f} MB this request)")
+        return {**probe, 'decode_bytes': cost}
@@ -0,0 +1,379 @@
+"""
+TrafficIQ Load Generator
+========================
+Simulates a fleet of intersection cameras against a locally running backend:
+- N intersections x 4 cameras posting frames to /upload
+- M Socket.IO dashboard clients listening for traffic_update
+- Stepped ramp of intersection counts with a report per stage
+
+Reports throughput, p50/p95/p99 upload latency, broadcast fan-out lag and
+error rates for every stage. Only loopback targets are accepted.
+
+Usage:
+    python loadtest.py --ramp 1,2,4,8 --rate 0.5 --clients 10 --stage-duration 30
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import socket
+import logging
+import argparse
+import ipaddress
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from urllib.parse import urlparse
+
+import cv2
+import numpy as np
+import requests
+import socketio
+
+logger = logging.getLogger('TrafficIQ.LoadTest')
+
+DIRECTIONS = ["north", "east", "south", "west"]
+
+
+# ============================================================================
+# TARGET VALIDATION
+# ============================================================================
+
+def ensure_localhost(url: str):
+    """Refuse to generate load against anything other than a loopback address."""
+    host = urlparse(url).hostname
+    if not host:
+        raise SystemExit(f"Invalid target URL: {url}")
+
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, None)}
+    except socket.gaierror as e:
+        raise SystemExit(f"Cannot resolve {host}: {e}")
+
+    for address in addresses:
+        if not ipaddress.ip_address(address.split('%')[0]).is_loopback:
+            raise SystemExit(f"Refusing to load-test non-local target {host} ({address})")
+
+
+# ============================================================================
+# FRAME SOURCE
+# ============================================================================
+
+def load_frames(frames_dir: Optional[str], limit: int = 16) -> List[Dict[str, Any]]:
+    """
+    Load sample frames to upload.
+
+    Uses images from frames_dir when available, otherwise synthesizes
+    JPEG frames so the tool works on a fresh checkout.
+    """
+    frames = []
+    if frames_dir and os.path.isdir(frames_dir):
+        patterns = ('*.jpg', '*.jpeg', '*.png', '*.webp')
+        paths = sorted(p for pattern in patterns for p in glob.glob(os.path.join(frames_dir, pattern)))
+        for path in paths[:limit]:
+            with open(path, 'rb') as f:
+                frames.append({'name': os.path.basename(path), 'data': f.read()})
+
+    if not frames:
+        rng = np.random.default_rng(42)
+        for i in range(4):
+            image = rng.integers(0, 255, size=(720, 1280, 3), dtype=np.uint8)
+            ok, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 85])
+            if ok:
+                frames.append({'name': f"synthetic_{i}.jpg", 'data': buffer.tobytes()})
+
+    return frames
+
+
+# ============================================================================
+# METRICS
+# ============================================================================
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    """Compute p50/p95/p99 in milliseconds for a list of second-based samples."""
+    if not values:
+        return {'p50': None, 'p95': None, 'p99': None}
+    p50, p95, p99 = np.percentile(np.asarray(values) * 1000.0, [50, 95, 99])
+    return {'p50': round(float(p50), 1), 'p95': round(float(p95), 1), 'p99': round(float(p99), 1)}
+
+
+class UploadStats:
+    """Thread-safe collector for upload samples."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = []
+        self.errors = 0
+        self.requests = 0
+        self.late = 0
+        self.status_codes = {}
+
+    def record(self, latency: float, status: Optional[int], ok: bool):
+        with self._lock:
+            self.requests += 1
+            key = str(status) if status is not None else 'exception'
+            self.status_codes[key] = self.status_codes.get(key, 0) + 1
+            if ok:
+                self.latencies.append(latency)
+            else:
+                self.errors += 1
+
+    def mark_late(self):
+        with self._lock:
+            self.late += 1
+
+
+class DashboardClient:
+    """Socket.IO client that measures traffic_update fan-out lag."""
+
+    def __init__(self, url: str, client_id: int):
+        self.url = url
+        self.client_id = client_id
+        self.sio = socketio.Client(reconnection=True)
+        self._lock = threading.Lock()
+        self._seen = set()
+        self.events = []  # (received_at, lag_seconds or None)
+        self.connect_errors = 0
+        self.sio.on('traffic_update', self._on_update)
+
+    def _on_update(self, data):
+        received_at = time.time()
+        stamp = data.get('last_updated') if isinstance(data, dict) else None
+        lag = None
+
+        with self._lock:
+            # Only the first delivery of a given state change measures fan-out;
+            # periodic signal-controller re-broadcasts carry an old stamp.
+            if stamp and stamp not in self._seen:
+                self._seen.add(stamp)
+                try:
+                    lag = received_at - datetime.fromisoformat(stamp).timestamp()
+                except ValueError:
+                    lag = None
+            self.events.append((received_at, lag))
+
+    def connect(self):
+        try:
+            self.sio.connect(self.url, transports=['websocket', 'polling'], wait_timeout=10)
+        except Exception as e:
+            self.connect_errors += 1
+            logger.warning(f"Dashboard client {self.client_id} failed to connect: {e}")
+
+    def disconnect(self):
+        try:
+            self.sio.disconnect()
+        except Exception:
+            pass
+
+    def events_between(self, start: float, end: float) -> List[tuple]:
+        with self._lock:
+            return [event for event in self.events if start <= event[0] < end]
+
+
+# ============================================================================
+# LOAD GENERATION
+# ============================================================================
+
+class Camera(threading.Thread):
+    """One simulated camera posting frames for a single direction at a fixed rate."""
+
+    def __init__(self, url: str, direction: str, rate: float, frames: List[Dict[str, Any]],
+                 stats: UploadStats, stop_event: threading.Event, offset: int, timeout: float):
+        super().__init__(daemon=True)
+        self.url = url.rstrip('/') + '/upload'
+        self.direction = direction
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.frames = frames
+        self.stats = stats
+        self.stop_event = stop_event
+        self.offset = offset
+        self.timeout = timeout
+
+    def run(self):
+        session = requests.Session()
+        # Spread camera start times across one interval to avoid lock-step bursts
+        next_send = time.time() + (self.offset % 16) * self.interval / 16
+        index = self.offset
+
+        while not self.stop_event.is_set():
+            delay = next_send - time.time()
+            if delay > 0:
+                if self.stop_event.wait(delay):
+                    break
+            elif self.interval and delay < -self.interval:
+                self.stats.mark_late()
+
+            frame = self.frames[index % len(self.frames)]
+            index += 1
+            started = time.time()
+            status = None
+            ok = False
+            try:
+                response = session.post(
+                    self.url,
+                    files={self.direction: (frame['name'], frame['data'])},
+                    timeout=self.timeout
+                )
+                status = response.status_code
+                ok = response.status_code == 200
+            except requests.RequestException:
+                ok = False
+            self.stats.record(time.time() - started, status, ok)
+
+            next_send = max(next_send + self.interval, time.time() - self.interval)
+
+        session.close()
+
+
+def run_stage(url: str, intersections: int, rate: float, duration: float,
+              frames: List[Dict[str, Any]], clients: List[DashboardClient],
+              timeout: float) -> Dict[str, Any]:
+    """Run one ramp stage and return its metrics."""
+    stats = UploadStats()
+    stop_event = threading.Event()
+    cameras = [
+        Camera(url, direction, rate, frames, stats, stop_event, i * len(DIRECTIONS) + j, timeout)
+        for i in range(intersections)
+        for j, direction in enumerate(DIRECTIONS)
+    ]
+
+    started = time.time()
+    for camera in cameras:
+        camera.start()
+    stop_event.wait(duration)
+    stop_event.set()
+    for camera in cameras:
+        camera.join(timeout=timeout)
+    ended = time.time()
+
+    # Allow in-flight broadcasts to land before attributing events
+    time.sleep(0.5)
+    elapsed = ended - started
+
+    lags = []
+    event_count = 0
+    for client in clients:
+        events = client.events_between(started, ended + 0.5)
+        event_count += len(events)
+        lags.extend(lag for _, lag in events if lag is not None and lag >= 0)
+
+    return {
+        'intersections': intersections,
+        'cameras': len(cameras),
+        'offered_rps': round(len(cameras) * rate, 2),
+        'achieved_rps': round((stats.requests - stats.errors) / elapsed, 2) if elapsed else 0.0,
+        'requests': stats.requests,
+        'errors': stats.errors,
+        'error_rate': round(stats.errors / stats.requests, 4) if stats.requests else 0.0,
+        'late_sends': stats.late,
+        'status_codes': stats.status_codes,
+        'upload_latency_ms': percentiles(stats.latencies),
+        'fanout_lag_ms': percentiles(lags),
+        'events_received': event_count,
+        'events_per_client_per_s': round(event_count / len(clients) / elapsed, 2) if clients and elapsed else 0.0,
+        'duration_s': round(elapsed, 1)
+    }
+
+
+# ============================================================================
+# REPORTING
+# ============================================================================
+
+def format_ms(value: Optional[float]) -> str:
+    return f"{value:.0f}" if value is not None else "-"
+
+
+def print_report(stages: List[Dict[str, Any]]):
+    """Print a per-stage summary table."""
+    header = (f"{'inter':>5} {'cams':>5} {'offer/s':>8} {'ok/s':>7} {'err%':>6} "
+              f"{'p50':>7} {'p95':>7} {'p99':>7} {'lag50':>7} {'lag99':>7} {'evt/cl/s':>9}")
+    print()
+    print(header)
+    print('-' * len(header))
+    for s in stages:
+        latency = s['upload_latency_ms']
+        lag = s['fanout_lag_ms']
+        print(f"{s['intersections']:>5} {s['cameras']:>5} {s['offered_rps']:>8.2f} "
+              f"{s['achieved_rps']:>7.2f} {s['error_rate'] * 100:>6.1f} "
+              f"{format_ms(latency['p50']):>7} {format_ms(latency['p95']):>7} {format_ms(latency['p99']):>7} "
+              f"{format_ms(lag['p50']):>7} {format_ms(lag['p99']):>7} {s['events_per_client_per_s']:>9.2f}")
+    print()
+    print("Latencies in ms. lag = traffic_update fan-out lag measured from the server's last_updated stamp.")
+
+
+# ============================================================================
+# ENTRY POINT
+# ============================================================================
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="TrafficIQ synthetic camera-fleet load generator")
+    parser.add_argument('--url', default='http://localhost:5000', help='Backend base URL (loopback only)')
+    parser.add_argument('--ramp', default='1,2,4,8',
+                        help='Comma-separated intersection counts, one stage each')
+    parser.add_argument('--rate', type=float, default=0.5, help='Frames per second per camera')
+    parser.add_argument('--clients', type=int, default=10, help='Number of Socket.IO dashboard clients')
+    parser.add_argument('--stage-duration', type=float, default=30.0, help='Seconds per ramp stage')
+    parser.add_argument('--frames-dir', default='static', help='Directory of sample frames to upload')
+    parser.add_argument('--timeout', type=float, default=60.0, help='Per-request timeout in seconds')
+    parser.add_argument('--json', dest='json_path', help='Write the full report to this JSON file')
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s | %(levelname)-8s | %(name)s | %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+    args = parse_args(argv)
+    ensure_localhost(args.url)
+
+    try:
+        ramp = [int(n) for n in args.ramp.split(',') if n.strip()]
+    except ValueError:
+        raise SystemExit(f"Invalid --ramp value: {args.ramp}")
+
+    frames = load_frames(args.frames_dir)
+    logger.info(f"Loaded {len(frames)} frame(s); ramp={ramp}, rate={args.rate}/s per camera")
+
+    clients = [DashboardClient(args.url, i) for i in range(args.clients)]
+    for client in clients:
+        client.connect()
+
+    stages = []
+    try:
+        for intersections in ramp:
+            logger.info(f"Stage: {intersections} intersection(s) x {len(DIRECTIONS)} cameras "
+                        f"for {args.stage_duration:.0f}s")
+            stage = run_stage(args.url, intersections, args.rate, args.stage_duration,
+                              frames, clients, args.timeout)
+            stages.append(stage)
+            logger.info(f"  ok/s={stage['achieved_rps']} errors={stage['errors']} "
+                        f"p99={format_ms(stage['upload_latency_ms']['p99'])}ms")
+    except KeyboardInterrupt:
+        logger.warning("Interrupted; reporting completed stages")
+    finally:
+        for client in clients:
+            client.disconnect()
+
+    print_report(stages)
+
+    if args.json_path:
+        report = {
+            'url': args.url,
+            'rate_per_camera': args.rate,
+            'clients': args.clients,
+            'client_connect_errors': sum(c.connect_errors for c in clients),
+            'stages': stages
+        }
+        with open(args.json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Report written to {args.json_path}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
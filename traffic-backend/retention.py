@@ -0,0 +1,284 @@
+"""
+TrafficIQ Retention Module
+==========================
+Background storage lifecycle management:
+- Per-tier TTLs for raw frames, annotated frames and records
+- Disk quota enforcement with least-recently-used eviction
+- Batched compaction of orphaned GridFS files
+"""
+
+import os
+import re
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Any, List
+
+from config import config
+import database as db
+
+logger = logging.getLogger('TrafficIQ.Retention')
+
+# Files the backend generates itself; anything else in the folders is left alone
+GENERATED_FILE_PATTERN = re.compile(
+    r'^((north|east|south|west)_[0-9a-f]{32}|annotated_[0-9a-zA-Z]+)\.[A-Za-z0-9]+$'
+)
+
+
+def _managed_files(folder: str) -> List[Dict[str, Any]]:
+    """List generated files in a folder with size and last-use time."""
+    files = []
+    try:
+        entries = list(os.scandir(folder))
+    except FileNotFoundError:
+        return files
+
+    for entry in entries:
+        if not entry.is_file() or not GENERATED_FILE_PATTERN.match(entry.name):
+            continue
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        files.append({
+            'path': entry.path,
+            'size': stat.st_size,
+            'modified': stat.st_mtime,
+            # atime is unreliable on noatime mounts; never treat a file as older than its last write
+            'last_used': max(stat.st_atime, stat.st_mtime)
+        })
+    return files
+
+
+def _remove(path: str) -> bool:
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+    except OSError as e:
+        logger.warning(f"Could not delete {path}: {e}")
+        return False
+
+
+class RetentionManager:
+    """Periodic retention sweeps and orphan compaction in a background thread."""
+
+    def __init__(self):
+        self.running = False
+        self._thread = None
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._last_compaction = 0.0
+        self._status = {
+            'last_sweep': None,
+            'sweep_seconds': None,
+            'tiers': {
+                tier: {'files': 0, 'bytes': 0}
+                for tier in ['raw_disk', 'raw_db', 'annotated_disk', 'annotated_db', 'quota', 'records']
+            },
+            'disk_usage_bytes': 0,
+            'disk_quota_bytes': config.DISK_QUOTA_MB * 1024 * 1024,
+            'compaction': {
+                'running': False,
+                'passes': 0,
+                'scanned': 0,
+                'purged': 0,
+                'reclaimed_bytes': 0,
+                'last_pass_scanned': 0,
+                'last_completed': None
+            },
+            'last_error': None
+        }
+
+    # ------------------------------------------------------------------
+    # Reporting
+    # ------------------------------------------------------------------
+
+    def _record(self, tier: str, files: int, size: int):
+        with self._lock:
+            self._status['tiers'][tier]['files'] += files
+            self._status['tiers'][tier]['bytes'] += size
+
+    def status(self) -> Dict[str, Any]:
+        """Cumulative counters since startup plus current compaction progress."""
+        with self._lock:
+            return {
+                **self._status,
+                'tiers': {tier: dict(counts) for tier, counts in self._status['tiers'].items()},
+                'compaction': dict(self._status['compaction']),
+                'ttl_hours': {
+                    'raw': config.RAW_FRAME_TTL_HOURS,
+                    'annotated': config.ANNOTATED_TTL_HOURS,
+                    'records': config.RECORD_TTL_DAYS * 24
+                }
+            }
+
+    # ------------------------------------------------------------------
+    # Disk tiers
+    # ------------------------------------------------------------------
+
+    def expire_disk(self, folder: str, ttl_hours: float, tier: str):
+        """Delete generated files in a folder older than the tier TTL."""
+        if ttl_hours <= 0:
+            return
+        cutoff = time.time() - ttl_hours * 3600
+        files = bytes_freed = 0
+        for f in _managed_files(folder):
+            if f['modified'] < cutoff and _remove(f['path']):
+                files += 1
+                bytes_freed += f['size']
+        if files:
+            logger.info(f"Retention: expired {files} file(s) from {folder} ({bytes_freed / 1e6:.1f} MB)")
+        self._record(tier, files, bytes_freed)
+
+    def enforce_quota(self):
+        """Evict least-recently-used generated files until disk usage is under quota."""
+        quota = config.DISK_QUOTA_MB * 1024 * 1024
+        files = _managed_files(config.UPLOAD_FOLDER) + _managed_files(config.PROCESSED_FOLDER)
+        usage = sum(f['size'] for f in files)
+
+        evicted = bytes_freed = 0
+        if quota > 0 and usage > quota:
+            for f in sorted(files, key=lambda item: item['last_used']):
+                if usage <= quota:
+                    break
+                if _remove(f['path']):
+                    usage -= f['size']
+                    evicted += 1
+                    bytes_freed += f['size']
+            logger.info(f"Retention: quota evicted {evicted} file(s) ({bytes_freed / 1e6:.1f} MB)")
+
+        self._record('quota', evicted, bytes_freed)
+        with self._lock:
+            self._status['disk_usage_bytes'] = usage
+
+    # ------------------------------------------------------------------
+    # Database tiers
+    # ------------------------------------------------------------------
+
+    def expire_database(self):
+        """Apply TTLs to stored images and records."""
+        now = datetime.utcnow()
+        batch_size = config.COMPACTION_BATCH_SIZE
+
+        if config.RAW_FRAME_TTL_HOURS > 0:
+            result = db.expire_record_images(
+                'original_image_id', now - timedelta(hours=config.RAW_FRAME_TTL_HOURS), batch_size
+            )
+            self._record('raw_db', result['files'], result['bytes'])
+
+        if config.ANNOTATED_TTL_HOURS > 0:
+            result = db.expire_record_images(
+                'processed_image_id', now - timedelta(hours=config.ANNOTATED_TTL_HOURS), batch_size
+            )
+            self._record('annotated_db', result['files'], result['bytes'])
+
+        if config.RECORD_TTL_DAYS > 0:
+            deleted = db.delete_records_before(now - timedelta(days=config.RECORD_TTL_DAYS))
+            self._record('records', deleted, 0)
+
+    def compact(self):
+        """
+        Purge GridFS files no record references, one batch at a time.
+
+        Sleeps between batches so the scan never competes with uploads
+        for long, and stops early when the manager is shut down.
+        """
+        with self._lock:
+            compaction = self._status['compaction']
+            compaction['running'] = True
+            compaction['last_pass_scanned'] = 0
+
+        last_id = None
+        try:
+            while self.running:
+                result = db.purge_orphaned_images(
+                    after_id=last_id,
+                    batch_size=config.COMPACTION_BATCH_SIZE,
+                    grace_period=timedelta(minutes=config.COMPACTION_GRACE_MINUTES)
+                )
+                with self._lock:
+                    compaction['scanned'] += result['scanned']
+                    compaction['last_pass_scanned'] += result['scanned']
+                    compaction['purged'] += result['purged']
+                    compaction['reclaimed_bytes'] += result['bytes']
+
+                if result['purged']:
+                    logger.info(f"Compaction: purged {result['purged']} orphaned file(s) "
+                                f"({result['bytes'] / 1e6:.1f} MB)")
+
+                last_id = result['last_id']
+                if last_id is None:
+                    with self._lock:
+                        compaction['passes'] += 1
+                        compaction['last_completed'] = datetime.utcnow().isoformat()
+                    break
+                time.sleep(config.COMPACTION_BATCH_PAUSE)
+        finally:
+            with self._lock:
+                compaction['running'] = False
+            self._last_compaction = time.time()
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def sweep(self):
+        """Run every retention step once."""
+        started = time.time()
+        self.expire_disk(config.UPLOAD_FOLDER, config.RAW_FRAME_TTL_HOURS, 'raw_disk')
+        self.expire_disk(config.PROCESSED_FOLDER, config.ANNOTATED_TTL_HOURS, 'annotated_disk')
+        self.enforce_quota()
+
+        try:
+            self.expire_database()
+            if time.time() - self._last_compaction >= config.COMPACTION_INTERVAL:
+                self.compact()
+            error = None
+        except Exception as e:
+            logger.warning(f"Retention database step skipped: {e}")
+            error = str(e)
+
+        with self._lock:
+            self._status['last_sweep'] = datetime.utcnow().isoformat()
+            self._status['sweep_seconds'] = round(time.time() - started, 2)
+            self._status['last_error'] = error
+
+    def run(self):
+        """Main retention loop."""
+        logger.info("Retention manager started")
+
+        while self.running:
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Retention sweep error: {e}")
+            self._wake.wait(config.RETENTION_INTERVAL)
+            self._wake.clear()
+
+        logger.info("Retention manager stopped")
+
+    def trigger(self):
+        """Run a sweep now instead of waiting for the next interval."""
+        self._wake.set()
+
+    def start(self):
+        """Start the retention manager in a background thread."""
+        if self.running or not config.RETENTION_ENABLED:
+            return
+
+        self.running = True
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the retention manager."""
+        self.running = False
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+
+retention_manager = RetentionManager()
@@ -0,0 +1,59 @@
+"""
+TrafficIQ Storage Package
+=========================
+Pluggable storage backends behind a common interface:
+- mongo: MongoDB + GridFS (default)
+- sqlite: embedded SQLite + content-addressed image files
+
+The backend is selected by Config.STORAGE_BACKEND.
+"""
+
+import threading
+
+from config import config
+from storage.base import StorageBackend
+from storage.breaker import StorageUnavailable
+from storage.journal import spill_journal
+
+_backend = None
+_backend_lock = threading.Lock()
+_write_listeners = []
+
+
+def add_write_listener(callback):
+    """Register a callback for background commits, on the current and any future backend."""
+    with _backend_lock:
+        _write_listeners.append(callback)
+        if _backend is not None:
+            _backend.add_write_listener(callback)
+
+
+def get_backend() -> StorageBackend:
+    """Get or create the configured storage backend."""
+    global _backend
+
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                name = config.STORAGE_BACKEND
+                if name == 'sqlite':
+                    from storage.sqlite import SQLiteBackend
+                    backend = SQLiteBackend()
+                elif name == 'mongo':
+                    from storage.mongo import MongoBackend
+                    backend = MongoBackend()
+                else:
+                    raise ValueError(f"Unknown storage backend: {name}")
+
+                for callback in _write_listeners:
+                    backend.add_write_listener(callback)
+
+                # Replay records spilled during an outage, now and on every recovery
+                backend.add_recovery_listener(lambda: spill_journal.replay(backend))
+                _backend = backend
+                spill_journal.replay_async(backend)
+
+    return _backend
+
+
+__all__ = ['StorageBackend', 'StorageUnavailable', 'add_write_listener', 'get_backend', 'spill_journal']
@@ -0,0 +1,128 @@
+"""
+TrafficIQ Storage - Backend Interface
+=====================================
+Operations every storage backend provides. Read methods never raise;
+they log and return empty results so the API keeps serving when
+storage is unavailable. Retention methods raise so sweeps can report
+failures.
+"""
+
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+
+class StorageBackend(ABC):
+    """Abstract storage backend for traffic records and images."""
+
+    @abstractmethod
+    def save_traffic_record(
+        self,
+        direction: str,
+        vehicle_count: int,
+        original_image_path: str,
+        detections: Optional[List[Dict[str, Any]]] = None,
+        image_size: Optional[List[int]] = None,
+        model: Optional[str] = None,
+        created_at: Optional[datetime] = None
+    ) -> Optional[str]:
+        """Store a record with its image renditions; returns the record ID or None."""
+
+    @abstractmethod
+    def save_traffic_records(self, records: List[Dict[str, Any]]) -> List[str]:
+        """
+        Store many records in one bulk insert.
+
+        Each item holds the save_traffic_record keyword arguments plus an
+        optional 'record_id'; records whose ID already exists are skipped,
+        so a retried batch is never stored twice. Returns the record IDs in
+        input order, or an empty list if the batch failed.
+        """
+
+    @abstractmethod
+    def get_record(self, record_id: str) -> Optional[Dict[str, Any]]:
+        """Get a single traffic record by ID."""
+
+    @abstractmethod
+    def get_image(self, image_id: str) -> Optional[Tuple[bytes, str]]:
+        """Get image data and content type by ID."""
+
+    @abstractmethod
+    def get_history(
+        self,
+        direction: Optional[str] = None,
+        page: int = 1,
+        per_page: int = 20,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """Get paginated traffic history as {'records', 'total', 'page', 'pages'}."""
+
+    @abstractmethod
+    def get_trends(self, period: str = 'hourly', days: int = 7) -> List[Dict[str, Any]]:
+        """Get traffic trends aggregated per direction by hour or day."""
+
+    @abstractmethod
+    def get_stats(self) -> Dict[str, Any]:
+        """Get summary statistics."""
+
+    @abstractmethod
+    def get_counts_since(self, since: datetime) -> List[Tuple[str, datetime, int]]:
+        """Get (direction, created_at, vehicle_count) for every record since a time, oldest first."""
+
+    @abstractmethod
+    def expire_record_images(
+        self,
+        field: str,
+        older_than: datetime,
+        batch_size: int = 500
+    ) -> Dict[str, int]:
+        """Delete one image tier from old records; returns {'files', 'bytes'}."""
+
+    @abstractmethod
+    def delete_records_before(self, older_than: datetime) -> int:
+        """Delete records created before a cutoff; returns the number deleted."""
+
+    @abstractmethod
+    def purge_orphaned_images(
+        self,
+        after_id: Optional[Any] = None,
+        batch_size: int = 500,
+        grace_period: timedelta = timedelta(minutes=10)
+    ) -> Dict[str, Any]:
+        """Purge one batch of unreferenced images; returns {'scanned', 'purged', 'bytes', 'last_id'}."""
+
+    @abstractmethod
+    def check_connection(self) -> bool:
+        """Check if the backend is reachable and working."""
+
+    def available(self) -> bool:
+        """Whether calls should be attempted; False while a circuit breaker is open."""
+        return True
+
+    def failure_count(self) -> int:
+        """
+        Backend failures (connection, server or database errors) since startup.
+
+        Reads that fail this way return empty results rather than raising.
+        Lookups of missing or malformed IDs are not failures.
+        """
+        return 0
+
+    def add_write_listener(self, callback: Callable[[], None]):
+        """
+        Register a callback run when queued writes commit in the background.
+
+        Backends that write synchronously never call it; the caller already
+        knows when its write landed.
+        """
+
+    def add_recovery_listener(self, callback: Callable[[], None]):
+        """Register a callback run when the backend recovers from an outage."""
+
+    def status(self) -> Dict[str, Any]:
+        """Backend health details for monitoring."""
+        return {'available': self.available()}
+
+    def close(self):
+        """Flush pending writes and release resources."""
@@ -0,0 +1,126 @@
+"""
+TrafficIQ Storage - Circuit Breaker
+===================================
+Fails storage calls fast while a backend is down:
+- Opens after repeated connection failures within a time window
+- While open, a background thread probes the backend
+- Closes on the first successful probe and notifies listeners
+"""
+
+import time
+import logging
+import threading
+from collections import deque
+from typing import Callable, Dict, Any, List, Optional
+
+logger = logging.getLogger('TrafficIQ.Database')
+
+
+class StorageUnavailable(Exception):
+    """Raised instead of attempting a call while the circuit is open."""
+
+
+class CircuitBreaker:
+    """Closed/open circuit breaker with background recovery probes."""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+
+    def __init__(
+        self,
+        name: str,
+        probe: Callable[[], None],
+        failure_threshold: int = 2,
+        failure_window: float = 30.0,
+        probe_interval: float = 5.0
+    ):
+        """
+        Args:
+            name: Label used in logs and status
+            probe: Callable that raises if the backend is still unreachable
+            failure_threshold: Failures within failure_window that open the circuit
+            failure_window: Seconds over which failures are counted
+            probe_interval: Seconds between recovery probes while open
+        """
+        self.name = name
+        self._probe = probe
+        self.failure_threshold = failure_threshold
+        self.failure_window = failure_window
+        self.probe_interval = probe_interval
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = deque()
+        self._opened_at = None
+        self._last_error = None
+        self._probes = 0
+        self._trips = 0
+        self._listeners: List[Callable[[], None]] = []
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def allow(self) -> bool:
+        """Whether calls should be attempted."""
+        return self._state == self.CLOSED
+
+    def add_listener(self, callback: Callable[[], None]):
+        """Register a callback run (in the probe thread) when the circuit closes."""
+        self._listeners.append(callback)
+
+    def record_failure(self, error: Optional[Exception] = None):
+        """Count a connection failure; opens the circuit at the threshold."""
+        now = time.time()
+        with self._lock:
+            self._last_error = str(error) if error else None
+            if self._state == self.OPEN:
+                return
+
+            self._failures.append(now)
+            while self._failures and now - self._failures[0] > self.failure_window:
+                self._failures.popleft()
+            if len(self._failures) < self.failure_threshold:
+                return
+
+            self._state = self.OPEN
+            self._opened_at = now
+            self._trips += 1
+            self._failures.clear()
+
+        logger.error(f"{self.name} unavailable; failing fast and probing every {self.probe_interval:g}s")
+        threading.Thread(target=self._probe_loop, daemon=True).start()
+
+    def _probe_loop(self):
+        while self._state == self.OPEN:
+            time.sleep(self.probe_interval)
+            try:
+                self._probe()
+            except Exception as e:
+                with self._lock:
+                    self._probes += 1
+                    self._last_error = str(e)
+                continue
+
+            with self._lock:
+                self._probes += 1
+                self._state = self.CLOSED
+                downtime = time.time() - self._opened_at
+                self._opened_at = None
+
+            logger.info(f"{self.name} recovered after {downtime:.0f}s")
+            for callback in self._listeners:
+                try:
+                    callback()
+                except Exception as e:
+                    logger.error(f"{self.name} recovery listener failed: {e}")
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'state': self._state,
+                'open_for_seconds': round(time.time() - self._opened_at, 1) if self._opened_at else None,
+                'trips': self._trips,
+                'probes': self._probes,
+                'last_error': self._last_error
+            }
@@ -0,0 +1,268 @@
+"""
+TrafficIQ Storage - Spill Journal
+=================================
+Local journal for records that could not be written during a storage
+outage. Each entry is a JSON file plus a copy of its frame (uploads may
+expire before the backend returns). Entries are replayed in order, with
+their original timestamps, once the backend recovers.
+
+Several processes may share one journal folder (app workers, backfill);
+each entry is claimed by an atomic rename before it is replayed, so only
+one process ever writes it.
+"""
+
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Any, List, Optional
+
+from config import config
+
+logger = logging.getLogger('TrafficIQ.Database')
+
+CLAIM_SUFFIX = '.replaying'
+QUARANTINE_FOLDER = 'quarantine'
+
+
+def _remove(path: Optional[str]):
+    """Delete a file that another process may already have removed."""
+    if not path:
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class SpillJournal:
+    """Append-only directory journal of pending traffic records."""
+
+    def __init__(self, folder: Optional[str] = None):
+        self.folder = folder or config.DB_JOURNAL_FOLDER
+        self._lock = threading.Lock()
+        self._replay_lock = threading.Lock()
+        self._last_replay = 0.0
+        self._replayed = 0
+        self._dropped = 0
+        self._quarantined = 0
+        self._listeners: List[Callable[[int], None]] = []
+
+    def _entries(self) -> List[str]:
+        """Complete entries, oldest first (names start with a sortable timestamp)."""
+        try:
+            return sorted(name for name in os.listdir(self.folder) if name.endswith('.json'))
+        except FileNotFoundError:
+            return []
+
+    def pending(self) -> int:
+        return len(self._entries())
+
+    def append(
+        self,
+        direction: str,
+        vehicle_count: int,
+        original_image_path: str,
+        detections: Optional[List[Dict[str, Any]]] = None,
+        image_size: Optional[List[int]] = None,
+        model: Optional[str] = None,
+        created_at: Optional[datetime] = None
+    ) -> bool:
+        """Spill a record to disk; returns False if the journal is full or unwritable."""
+        with self._lock:
+            if self.pending() >= config.DB_JOURNAL_MAX_ENTRIES:
+                self._dropped += 1
+                logger.error("Spill journal full; dropping traffic record")
+                return False
+
+            try:
+                os.makedirs(self.folder, exist_ok=True)
+                created_at = created_at or datetime.utcnow()
+                entry_id = f"{created_at:%Y%m%dT%H%M%S%f}_{uuid.uuid4().hex[:8]}"
+
+                image_path = None
+                if os.path.exists(original_image_path):
+                    image_path = os.path.join(
+                        self.folder, entry_id + os.path.splitext(original_image_path)[1]
+                    )
+                    shutil.copyfile(original_image_path, image_path)
+
+                entry = {
+                    'direction': direction,
+                    'vehicle_count': vehicle_count,
+                    'image_path': image_path,
+                    'detections': detections or [],
+                    'image_size': image_size,
+                    'model': model,
+                    'created_at': created_at.isoformat()
+                }
+
+                # The .json appears last, so a crash never leaves a half-written entry
+                path = os.path.join(self.folder, f"{entry_id}.json")
+                with open(f"{path}.tmp", 'w') as f:
+                    json.dump(entry, f)
+                os.replace(f"{path}.tmp", path)
+
+                logger.warning(f"Storage write failed; spilled {direction} record to journal")
+                return True
+
+            except OSError as e:
+                self._dropped += 1
+                logger.error(f"Failed to write spill journal entry: {e}")
+                return False
+
+    def add_listener(self, callback: Callable[[int], None]):
+        """Register a callback run with the number of records written after a replay."""
+        self._listeners.append(callback)
+
+    def _claim(self, name: str) -> Optional[str]:
+        """Atomically take an entry for replay; None if another process got it first."""
+        path = os.path.join(self.folder, name)
+        claimed = path + CLAIM_SUFFIX
+        try:
+            os.rename(path, claimed)
+        except FileNotFoundError:
+            return None
+        os.utime(claimed)  # Claim time, for reclaiming entries of a crashed process
+        return claimed
+
+    def _release(self, claimed: str, entry: Dict[str, Any]):
+        """Return a claimed entry to the journal with its attempt count updated."""
+        with open(f"{claimed}.tmp", 'w') as f:
+            json.dump(entry, f)
+        os.replace(f"{claimed}.tmp", claimed)
+        os.rename(claimed, claimed[:-len(CLAIM_SUFFIX)])
+
+    def _quarantine(self, claimed: str, entry: Dict[str, Any]):
+        """Move an entry that keeps failing out of the replay queue."""
+        folder = os.path.join(self.folder, QUARANTINE_FOLDER)
+        os.makedirs(folder, exist_ok=True)
+        image_path = entry.get('image_path')
+        if image_path and os.path.exists(image_path):
+            entry['image_path'] = os.path.join(folder, os.path.basename(image_path))
+            os.replace(image_path, entry['image_path'])
+        with open(os.path.join(folder, os.path.basename(claimed)[:-len(CLAIM_SUFFIX)]), 'w') as f:
+            json.dump(entry, f)
+        _remove(claimed)
+        with self._lock:
+            self._quarantined += 1
+        logger.error(f"Quarantined journal entry after {entry['attempts']} failed replay(s): "
+                     f"{os.path.basename(claimed)[:-len(CLAIM_SUFFIX)]}")
+
+    def _reclaim_stale(self):
+        """Requeue entries claimed by a process that died mid-replay."""
+        try:
+            names = [name for name in os.listdir(self.folder) if name.endswith(CLAIM_SUFFIX)]
+        except FileNotFoundError:
+            return
+        cutoff = time.time() - config.DB_JOURNAL_CLAIM_TIMEOUT
+        for name in names:
+            path = os.path.join(self.folder, name)
+            try:
+                if os.stat(path).st_mtime < cutoff:
+                    os.rename(path, path[:-len(CLAIM_SUFFIX)])
+            except FileNotFoundError:
+                pass
+
+    def replay(self, backend) -> int:
+        """
+        Write journaled records to the backend in order.
+
+        Each record is committed before its entry is deleted. Stops when
+        the backend becomes unreachable, leaving the rest for the next
+        replay. An entry that fails while the backend is reachable is
+        retried on later replays and quarantined after
+        DB_JOURNAL_MAX_ATTEMPTS. Returns the number replayed.
+        """
+        if not self._replay_lock.acquire(blocking=False):
+            return 0
+
+        replayed = 0
+        try:
+            self._last_replay = time.time()
+            self._reclaim_stale()
+            for name in self._entries():
+                if not backend.available():
+                    break
+
+                claimed = self._claim(name)
+                if claimed is None:
+                    continue
+                try:
+                    with open(claimed) as f:
+                        entry = json.load(f)
+                except (OSError, ValueError) as e:
+                    logger.error(f"Discarding unreadable journal entry {name}: {e}")
+                    _remove(claimed)
+                    continue
+
+                image_path = entry.get('image_path') or ''
+                record_ids = backend.save_traffic_records([{
+                    # Deterministic, so an entry requeued after a crash mid-replay is not stored twice
+                    'record_id': hashlib.sha1(name[:-len('.json')].encode()).hexdigest()[:24],
+                    'direction': entry['direction'],
+                    'vehicle_count': entry['vehicle_count'],
+                    'original_image_path': image_path,
+                    'detections': entry.get('detections'),
+                    'image_size': entry.get('image_size'),
+                    'model': entry.get('model'),
+                    'created_at': datetime.fromisoformat(entry['created_at'])
+                }])
+                if record_ids:
+                    _remove(claimed)
+                    _remove(image_path)
+                    replayed += 1
+                    continue
+
+                if not backend.available() or not backend.check_connection():
+                    # Outage, not this entry's fault: keep its attempts and stop
+                    self._release(claimed, entry)
+                    break
+
+                entry['attempts'] = entry.get('attempts', 0) + 1
+                if entry['attempts'] >= config.DB_JOURNAL_MAX_ATTEMPTS:
+                    self._quarantine(claimed, entry)
+                else:
+                    self._release(claimed, entry)
+
+            if replayed:
+                logger.info(f"Replayed {replayed} journaled record(s); {self.pending()} pending")
+                for callback in self._listeners:
+                    try:
+                        callback(replayed)
+                    except Exception as e:
+                        logger.error(f"Journal replay listener failed: {e}")
+            with self._lock:
+                self._replayed += replayed
+            return replayed
+        finally:
+            self._replay_lock.release()
+
+    def replay_async(self, backend, min_interval: float = 0.0):
+        """
+        Replay in a background thread so callers never wait on it.
+
+        Skipped when nothing is pending or a replay started less than
+        min_interval seconds ago.
+        """
+        if time.time() - self._last_replay < min_interval or self._replay_lock.locked():
+            return
+        if self.pending():
+            threading.Thread(target=self.replay, args=(backend,), daemon=True).start()
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'pending': self.pending(),
+                'replayed': self._replayed,
+                'dropped': self._dropped,
+                'quarantined': self._quarantined
+            }
+
+
+spill_journal = SpillJournal()
@@ -0,0 +1,618 @@
+"""
+TrafficIQ Storage - MongoDB Backend
+===================================
+Stores traffic records in MongoDB and images in GridFS. Connections
+are pooled and guarded by a circuit breaker so an outage fails fast.
+"""
+
+import os
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, ConnectionFailure, OperationFailure
+
+from config import config
+from imaging import build_renditions
+from storage.base import StorageBackend
+from storage.breaker import CircuitBreaker, StorageUnavailable
+
+logger = logging.getLogger('TrafficIQ.Database')
+
+
+def _format_record(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a traffic_records document into an API-friendly dict."""
+    return {
+        'id': str(doc['_id']),
+        'direction': doc['direction'],
+        'vehicle_count': doc['vehicle_count'],
+        'original_image_id': str(doc.get('original_image_id') or ''),
+        'processed_image_id': str(doc.get('processed_image_id') or ''),
+        'thumbnails': {name: str(image_id) for name, image_id in (doc.get('thumbnails') or {}).items()},
+        'detections': doc.get('detections', []),
+        'image_size': doc.get('image_size'),
+        'model': doc.get('model'),
+        'created_at': doc['created_at'].isoformat()
+    }
+
+
+class MongoBackend(StorageBackend):
+    """MongoDB + GridFS storage backend."""
+    
+    def __init__(self):
+        # MongoDB connection - initialized on demand
+        self._client = None
+        self._db = None
+        self._fs = None
+        self._connect_lock = threading.Lock()
+        self._failures = 0
+        self._breaker = CircuitBreaker(
+            'MongoDB',
+            probe=self._probe,
+            failure_threshold=config.DB_BREAKER_FAILURE_THRESHOLD,
+            failure_window=config.DB_BREAKER_FAILURE_WINDOW,
+            probe_interval=config.DB_BREAKER_PROBE_INTERVAL
+        )
+    
+    def _connect(self):
+        """Create a client, verify it with a ping and ensure indexes; returns (client, db, fs)."""
+        from pymongo import MongoClient
+        import gridfs
+        
+        client = MongoClient(
+            config.MONGODB_URI,
+            maxPoolSize=config.MONGODB_MAX_POOL_SIZE,
+            minPoolSize=config.MONGODB_MIN_POOL_SIZE,
+            maxIdleTimeMS=config.MONGODB_MAX_IDLE_TIME_MS,
+            waitQueueTimeoutMS=config.MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+            connectTimeoutMS=config.MONGODB_CONNECT_TIMEOUT_MS,
+            socketTimeoutMS=config.MONGODB_SOCKET_TIMEOUT_MS,
+            serverSelectionTimeoutMS=config.MONGODB_SERVER_SELECTION_TIMEOUT_MS
+        )
+        try:
+            # Test connection
+            client.admin.command('ping')
+            
+            db = client[config.MONGODB_DB_NAME]
+            
+            # Create indexes
+            db.traffic_records.create_index([("created_at", -1)])
+            db.traffic_records.create_index([("direction", 1)])
+            db.traffic_records.create_index([("direction", 1), ("created_at", -1)])
+            # Image references, for retention expiry and compaction; only records still holding one
+            for field in ['original_image_id', 'processed_image_id'] + [f'thumbnails.{name}' for name in config.THUMBNAIL_SIZES]:
+                db.traffic_records.create_index(
+                    [(field, 1), ("created_at", 1)],
+                    partialFilterExpression={field: {'$exists': True}}
+                )
+        except Exception:
+            client.close()
+            raise
+        
+        return client, db, gridfs.GridFS(db)
+    
+    def _publish(self, client, db, fs):
+        """Install a fully initialized connection; a racing duplicate is closed."""
+        with self._connect_lock:
+            if self._client is None:
+                self._db, self._fs, self._client = db, fs, client
+                logger.info(f"Connected to MongoDB: {config.MONGODB_DB_NAME}")
+                return
+        client.close()
+    
+    def get_connection(self):
+        """
+        Get or create MongoDB connection.
+        
+        Raises StorageUnavailable without touching the network while the
+        circuit breaker is open.
+        """
+        if not self._breaker.allow():
+            raise StorageUnavailable("MongoDB circuit open")
+        
+        if self._client is None:
+            # Connect without holding the lock, so callers arriving during a
+            # slow or failing attempt time out together instead of in turn
+            try:
+                self._publish(*self._connect())
+            except Exception as e:
+                logger.error(f"MongoDB connection failed: {e}")
+                self._breaker.record_failure(e)
+                raise StorageUnavailable(str(e)) from e
+        
+        return self._db, self._fs
+    
+    def _probe(self):
+        """Recovery probe run by the circuit breaker while open."""
+        client = self._client
+        if client is None:
+            self._publish(*self._connect())
+        else:
+            client.admin.command('ping')
+    
+    def _record_error(self, error: Exception):
+        """Count server and connection failures; connection-level ones also feed the circuit breaker."""
+        if isinstance(error, (ConnectionFailure, OperationFailure, StorageUnavailable)):
+            self._failures += 1
+        if isinstance(error, ConnectionFailure):
+            self._breaker.record_failure(error)
+    
+    def available(self) -> bool:
+        return self._breaker.allow()
+    
+    def failure_count(self) -> int:
+        return self._failures
+    
+    def add_recovery_listener(self, callback):
+        self._breaker.add_listener(callback)
+    
+    def status(self) -> Dict[str, Any]:
+        return {
+            'available': self.available(),
+            'connected': self._client is not None,
+            'breaker': self._breaker.status()
+        }
+    
+    def save_traffic_record(
+        self,
+        direction: str,
+        vehicle_count: int,
+        original_image_path: str,
+        detections: Optional[List[Dict[str, Any]]] = None,
+        image_size: Optional[List[int]] = None,
+        model: Optional[str] = None,
+        created_at: Optional[datetime] = None
+    ) -> Optional[str]:
+        """
+        Save a traffic record with its original image to MongoDB.
+        
+        The image is re-encoded with the configured format, quality and max
+        dimension, and a thumbnail pyramid is stored alongside it. Annotated
+        images are not stored; they are rendered on demand from the original
+        image and the structured detections.
+        
+        Args:
+            direction: Traffic direction (north, east, south, west)
+            vehicle_count: Number of vehicles detected
+            original_image_path: Path to original uploaded image
+            detections: Detected boxes, classes and confidences
+            image_size: Original image size as [width, height]
+            model: Model ladder level that produced the count, e.g. 'yolov8n.pt@416'
+        
+        Returns:
+            Record ID as string, or None if failed
+        """
+        try:
+            db, fs = self.get_connection()
+            record = self._build_record(
+                fs, direction, vehicle_count, original_image_path,
+                detections, image_size, model, created_at
+            )
+            result = db.traffic_records.insert_one(record)
+            logger.info(f"Saved traffic record: {direction} - {vehicle_count} vehicles")
+            
+            return str(result.inserted_id)
+        
+        except Exception as e:
+            self._record_error(e)
+            logger.error(f"Failed to save traffic record: {e}")
+            return None
+    
+    def save_traffic_records(self, records: List[Dict[str, Any]]) -> List[str]:
+        """
+        Store many records with a single insert_many.
+        
+        Items with a 'record_id' are idempotent: records that already exist
+        are skipped (their images are not stored again) and duplicate-key
+        errors from a concurrent insert are ignored. Images are written to
+        GridFS first; if the insert fails they are left unreferenced and
+        reclaimed by compaction.
+        """
+        if not records:
+            return []
+        try:
+            db, fs = self.get_connection()
+            ids = [ObjectId(record['record_id']) if record.get('record_id') else None for record in records]
+            requested = [record_id for record_id in ids if record_id is not None]
+            existing = {
+                doc['_id'] for doc in db.traffic_records.find({'_id': {'$in': requested}}, {'_id': 1})
+            } if requested else set()
+            
+            documents = []
+            record_ids = []
+            for record, record_id in zip(records, ids):
+                if record_id in existing:
+                    record_ids.append(str(record_id))
+                    continue
+                document = self._build_record(fs, **record)
+                documents.append(document)
+                record_ids.append(str(document['_id']))
+            
+            if documents:
+                try:
+                    db.traffic_records.insert_many(documents, ordered=False)
+                except BulkWriteError as e:
+                    errors = e.details.get('writeErrors', [])
+                    if not errors or any(error.get('code') != 11000 for error in errors):
+                        raise
+            
+            if existing:
+                logger.info(f"Skipped {len(existing)} traffic record(s) already stored")
+            logger.info(f"Saved {len(documents)} traffic records in bulk")
+            return record_ids
+        
+        except Exception as e:
+            self._record_error(e)
+            logger.error(f"Failed to bulk save {len(records)} traffic records: {e}")
+            return []
+    
+    def _build_record(
+        self,
+        fs,
+        direction: str,
+        vehicle_count: int,
+        original_image_path: str,
+        detections: Optional[List[Dict[str, Any]]] = None,
+        image_size: Optional[List[int]] = None,
+        model: Optional[str] = None,
+        created_at: Optional[datetime] = None,
+        record_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Store the image and thumbnails in GridFS and build the record document."""
+        original_image_id = None
+        thumbnails = {}
+        
+        if os.path.exists(original_image_path):
+            stem = os.path.splitext(os.path.basename(original_image_path))[0]
+            for name, rendition in build_renditions(original_image_path).items():
+                suffix = '' if name == 'full' else f"_{name}"
+                image_id = fs.put(
+                    rendition['data'],
+                    filename=f"{stem}{suffix}{rendition['extension']}",
+                    content_type=rendition['content_type'],
+                    direction=direction,
+                    rendition=name,
+                    width=rendition['width'],
+                    height=rendition['height']
+                )
+                if name == 'full':
+                    original_image_id = image_id
+                else:
+                    thumbnails[name] = image_id
+        
+        record = {
+            '_id': ObjectId(record_id) if record_id else ObjectId(),
+            'direction': direction,
+            'vehicle_count': vehicle_count,
+            'thumbnails': thumbnails,
+            'detections': detections or [],
+            'image_size': image_size,
+            'model': model,
+            'created_at': created_at or datetime.utcnow()
+        }
+        # Image references are only set when present, to stay out of the retention index
+        if original_image_id is not None:
+            record['original_image_id'] = original_image_id
+        return record
+    
+    def get_record(self, record_id: str) -> Optional[Dict[str, Any]]:
+        """Get a single traffic record by ID."""
+        try:
+            db, fs = self.get_connection()
+            doc = db.traffic_records.find_one({'_id': ObjectId(record_id)})
+            return _format_record(doc) if doc else None
+        except Exception as e:
+            self._record_error(e)
+            logger.error(f"Failed to get record {record_id}: {e}")
+            return None
+    
+    def get_image(self, image_id: str) -> Optional[Tuple[bytes, str]]:
+        """Get image data and content type from GridFS by ID."""
+        try:
+            db, fs = self.get_connection()
+            grid_out = fs.get(ObjectId(image_id))
+            return grid_out.read(), grid_out.content_type or 'image/jpeg'
+        except Exception as e:
+            self._record_error(e)
+            logger.error(f"Failed to get image {image_id}: {e}")
+            return None
+    
+    def get_history(
+        self,
+        direction: Optional[str] = None,
+        page: int = 1,
+        per_page: int = 20,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """
+        Get paginated traffic history.
+        
+        Returns dict with 'records', 'total', 'page', 'pages'
+        """
+        try:
+            db, fs = self.get_connection()
+            
+            # Build query
+            query = {}
+            if direction:
+                query['direction'] = direction
+            if start_date or end_date:
+                query['created_at'] = {}
+                if start_date:
+                    query['created_at']['$gte'] = start_date
+                if end_date:
+                    query['created_at']['$lte'] = end_date
+            
+            # Count total
+            total = db.traffic_records.count_documents(query)
+            pages = (total + per_page - 1) // per_page
+            
+            # Get records
+            skip = (page - 1) * per_page
+            cursor = db.traffic_records.find(query).sort('created_at', -1).skip(skip).limit(per_page)
+            
+            records = [_format_record(doc) for doc in cursor]
+            
+            return {
+                'records': records,
+                'total': total,
+                'page': page,
+                'pages': pages
+            }
+        
+        except Exception as e:
+            self._record_error(e)
+            logger.error(f"Failed to get history: {e}")
+            return {'records': [], 'total': 0, 'page': 1, 'pages': 0}
+    
+    def get_trends(self, period: str = 'hourly', days: int = 7) -> List[Dict[str, Any]]:
+        """
+        Get traffic trends aggregated by hour or day.
+        
+        Args:
+            period: 'hourly' or 'daily'
+            days: Number of days to look back
+        """
+        try:
+            db, fs = self.get_connection()
+            
+            start_date = datetime.utcnow() - timedelta(days=days)
+            
+            # Date grouping format
+            if period == 'daily':
+                date_format = '%Y-%m-%d'
+                group_id = {
+                    'direction': '$direction',
+                    'date': {'$dateToString': {'format': date_format, 'date': '$created_at'}}
+                }
+            else:  # hourly
+                date_format = '%Y-%m-%d %H:00'
+                group_id = {
+                    'direction': '$direction',
+                    'date': {'$dateToString': {'format': '%Y-%m-%dT%H:00:00', 'date': '$created_at'}}
+                }
+            
+            pipeline = [
+                {'$match': {'created_at': {'$gte': start_date}}},
+                {'$group': {
+                    '_id': group_id,
+                    'avg_count': {'$avg': '$vehicle_count'},
+                    'max_count': {'$max': '$vehicle_count'},
+                    'min_count': {'$min': '$vehicle_count'},
+                    'total_records': {'$sum': 1}
+                }},
+                {'$sort': {'_id.date': 1}}
+            ]
+            
+            results = list(db.traffic_records.aggregate(pipeline))
+            
+            trends = []
+            for doc in results:
+                trends.append({
+                    'direction': doc['_id']['direction'],
+                    'period': doc['_id']['date'],
+                    'avg_count': round(doc['avg_count'], 1),
+                    'max_count': doc['max_count'],
+                    'min_count': doc['min_count'],
+                    'total_records': doc['total_records']
+                })
+            
+            return trends
+        
+        except Exception as e:
+            self._record_error(e)
+            logger.error(f"Failed to get trends: {e}")
+            return []
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get summary statistics."""
+        try:
+            db, fs = self.get_connection()
+            
+            # Total records
+            total_records = db.traffic_records.count_documents({})
+            
+            # Records today
+            today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+            today_records = db.traffic_records.count_documents({'created_at': {'$gte': today_start}})
+            
+            # Stats by direction
+            pipeline = [
+                {'$group': {
+                    '_id': '$direction',
+                    'total_vehicles': {'$sum': '$vehicle_count'},
+                    'avg_vehicles': {'$avg': '$vehicle_count'},
+                    'record_count': {'$sum': 1}
+                }}
+            ]
+            direction_stats = {doc['_id']: {
+                'total_vehicles': doc['total_vehicles'],
+                'avg_vehicles': round(doc['avg_vehicles'], 1),
+                'record_count': doc['record_count']
+            } for doc in db.traffic_records.aggregate(pipeline)}
+            
+            # Peak hours (last 7 days)
+            week_ago = datetime.utcnow() - timedelta(days=7)
+            peak_pipeline = [
+                {'$match': {'created_at': {'$gte': week_ago}}},
+                {'$group': {
+                    '_id': {'$hour': '$created_at'},
+                    'avg_vehicles': {'$avg': '$vehicle_count'}
+                }},
+                {'$sort': {'avg_vehicles': -1}},
+                {'$limit': 3}
+            ]
+            peak_hours = [doc['_id'] for doc in db.traffic_records.aggregate(peak_pipeline)]
+            
+            return {
+                'total_records': total_records,
+                'today_records': today_records,
+                'by_direction': direction_stats,
+                'peak_hours': peak_hours,
+                'last_updated': datetime.utcnow().isoformat()
+            }
+        
+        except Exception as e:
+            self._record_error(e)
+            logger.error(f"Failed to get stats: {e}")
+            return {
+                'total_records': 0,
+                'today_records': 0,
+                'by_direction': {},
+                'peak_hours': [],
+                'last_updated': datetime.utcnow().isoformat()
+            }
+    
+    def get_counts_since(self, since: datetime) -> List[Tuple[str, datetime, int]]:
+        """Get (direction, created_at, vehicle_count) for every record since a time, oldest first."""
+        try:
+            db, fs = self.get_connection()
+            cursor = db.traffic_records.find(
+                {'created_at': {'$gte': since}},
+                {'_id': 0, 'direction': 1, 'created_at': 1, 'vehicle_count': 1}
+            ).sort('created_at', 1).batch_size(5000)
+            return [(doc['direction'], doc['created_at'], doc['vehicle_count']) for doc in cursor]
+        
+        except Exception as e:
+            self._record_error(e)
+            logger.error(f"Failed to get counts: {e}")
+            return []
+    
+    def expire_record_images(
+        self,
+        field: str,
+        older_than: datetime,
+        batch_size: int = 500
+    ) -> Dict[str, int]:
+        """
+        Delete one image tier from records created before a cutoff.
+        
+        The record is kept; the image reference is cleared so it is not
+        expired twice. Works in batches to keep each round trip small.
+        
+        Args:
+            field: Record field holding the GridFS ID ('original_image_id' or 'processed_image_id')
+            older_than: Only records created before this time are touched
+            batch_size: Records handled per round trip
+        
+        Returns:
+            Dict with 'files' deleted and 'bytes' reclaimed
+        """
+        db, fs = self.get_connection()
+        # Cleared references are unset, so the partial index only holds records still to expire
+        query = {field: {'$exists': True}, 'created_at': {'$lt': older_than}}
+        deleted = {'files': 0, 'bytes': 0}
+        
+        while True:
+            docs = list(db.traffic_records.find(query, {field: 1}).limit(batch_size))
+            if not docs:
+                break
+            
+            image_ids = [doc[field] for doc in docs if doc.get(field)]
+            deleted['bytes'] += sum(
+                f.get('length', 0) for f in db.fs.files.find({'_id': {'$in': image_ids}}, {'length': 1})
+            )
+            for image_id in image_ids:
+                fs.delete(image_id)
+            deleted['files'] += len(image_ids)
+            
+            db.traffic_records.update_many(
+                {'_id': {'$in': [doc['_id'] for doc in docs]}},
+                {'$unset': {field: ''}}
+            )
+            
+            if len(docs) < batch_size:
+                break
+        
+        return deleted
+    
+    def delete_records_before(self, older_than: datetime) -> int:
+        """Delete records created before a cutoff; their images are left for compaction."""
+        db, fs = self.get_connection()
+        result = db.traffic_records.delete_many({'created_at': {'$lt': older_than}})
+        return result.deleted_count
+    
+    def purge_orphaned_images(
+        self,
+        after_id: Optional[ObjectId] = None,
+        batch_size: int = 500,
+        grace_period: timedelta = timedelta(minutes=10)
+    ) -> Dict[str, Any]:
+        """
+        Scan one batch of GridFS files and delete those no record references.
+        
+        Files are scanned in _id order so callers can resume from 'last_id'.
+        Files newer than the grace period are skipped, since an upload stores
+        its images before inserting the record that references them.
+        
+        Returns:
+            Dict with 'scanned', 'purged', 'bytes' and 'last_id' (None when done)
+        """
+        db, fs = self.get_connection()
+        query = {'_id': {'$gt': after_id}} if after_id else {}
+        files = list(
+            db.fs.files.find(query, {'length': 1, 'uploadDate': 1, 'rendition': 1})
+            .sort('_id', 1)
+            .limit(batch_size)
+        )
+        if not files:
+            return {'scanned': 0, 'purged': 0, 'bytes': 0, 'last_id': None}
+        
+        cutoff = datetime.utcnow() - grace_period
+        candidates = {f['_id']: f for f in files if f.get('uploadDate') and f['uploadDate'] < cutoff}
+        
+        referenced = set()
+        if candidates:
+            ids = list(candidates)
+            renditions = {f.get('rendition') for f in candidates.values()} | set(config.THUMBNAIL_SIZES)
+            # '$exists' matches the partial index filters, so each clause is an index lookup
+            reference_fields = ['original_image_id', 'processed_image_id']
+            reference_fields += [f'thumbnails.{name}' for name in renditions if name and name != 'full']
+            clauses = [{field: {'$exists': True, '$in': ids}} for field in reference_fields]
+            
+            fields = ['original_image_id', 'processed_image_id', 'thumbnails']
+            for doc in db.traffic_records.find({'$or': clauses}, {field: 1 for field in fields}):
+                referenced.add(doc.get('original_image_id'))
+                referenced.add(doc.get('processed_image_id'))
+                referenced.update((doc.get('thumbnails') or {}).values())
+        
+        orphans = [file_id for file_id in candidates if file_id not in referenced]
+        for file_id in orphans:
+            fs.delete(file_id)
+        
+        return {
+            'scanned': len(files),
+            'purged': len(orphans),
+            'bytes': sum(candidates[file_id].get('length', 0) for file_id in orphans),
+            'last_id': files[-1]['_id'] if len(files) == batch_size else None
+        }
+    
+    def check_connection(self) -> bool:
+        """Check if MongoDB is connected and working."""
+        try:
+            db, fs = self.get_connection()
+            return True
+        except:
+            return False
@@ -0,0 +1,848 @@
+"""
+TrafficIQ Storage - Embedded SQLite Backend
+===========================================
+Serverless storage for edge deployments:
+- Records in SQLite (WAL mode) written in batches by a background writer;
+  reads see committed rows and do not force the queue out
+- Images as content-addressed files on disk, deduplicated by SHA-256
+- Periodic incremental Parquet export of records for analytics
+"""
+
+import os
+import json
+import time
+import uuid
+import atexit
+import sqlite3
+import importlib.util
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+from config import config
+from imaging import build_renditions
+from storage.base import StorageBackend
+from storage.journal import spill_journal
+
+logger = logging.getLogger('TrafficIQ.Database')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS traffic_records (
+    id TEXT PRIMARY KEY,
+    direction TEXT NOT NULL,
+    vehicle_count INTEGER NOT NULL,
+    original_image_id TEXT,
+    processed_image_id TEXT,
+    thumbnails TEXT NOT NULL DEFAULT '{}',
+    detections TEXT NOT NULL DEFAULT '[]',
+    image_size TEXT,
+    model TEXT,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_records_created_at ON traffic_records (created_at);
+CREATE INDEX IF NOT EXISTS idx_records_direction_created_at ON traffic_records (direction, created_at);
+-- Records still holding an image of each tier, so retention sweeps skip expired history
+CREATE INDEX IF NOT EXISTS idx_records_original_pending ON traffic_records (created_at) WHERE original_image_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_records_processed_pending ON traffic_records (created_at) WHERE processed_image_id IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS images (
+    id TEXT PRIMARY KEY,
+    extension TEXT NOT NULL,
+    content_type TEXT NOT NULL,
+    length INTEGER NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    created_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS record_images (
+    record_id TEXT NOT NULL,
+    image_id TEXT NOT NULL,
+    rendition TEXT NOT NULL,
+    PRIMARY KEY (record_id, rendition)
+);
+CREATE INDEX IF NOT EXISTS idx_record_images_image ON record_images (image_id);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+RECORD_COLUMNS = (
+    'id', 'direction', 'vehicle_count', 'original_image_id', 'processed_image_id',
+    'thumbnails', 'detections', 'image_size', 'model', 'created_at'
+)
+
+# Record field -> rendition name in record_images
+IMAGE_FIELDS = {'original_image_id': 'full', 'processed_image_id': 'processed'}
+
+
+def _timestamp(value: datetime) -> str:
+    """Fixed-width ISO timestamp so string order matches time order."""
+    return value.isoformat(timespec='microseconds')
+
+
+def _format_row(row: sqlite3.Row) -> Dict[str, Any]:
+    """Convert a traffic_records row into an API-friendly dict."""
+    return {
+        'id': row['id'],
+        'direction': row['direction'],
+        'vehicle_count': row['vehicle_count'],
+        'original_image_id': row['original_image_id'] or '',
+        'processed_image_id': row['processed_image_id'] or '',
+        'thumbnails': json.loads(row['thumbnails'] or '{}'),
+        'detections': json.loads(row['detections'] or '[]'),
+        'image_size': json.loads(row['image_size']) if row['image_size'] else None,
+        'model': row['model'],
+        'created_at': row['created_at']
+    }
+
+
+class SQLiteBackend(StorageBackend):
+    """SQLite + content-addressed file storage backend."""
+
+    def __init__(self, path: Optional[str] = None, image_folder: Optional[str] = None):
+        self.path = path or config.SQLITE_PATH
+        self.image_folder = image_folder or config.IMAGE_STORE_FOLDER
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        os.makedirs(self.image_folder, exist_ok=True)
+
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._pending = []
+        self._wake = threading.Event()
+        self._running = True
+        self._closed = threading.Event()
+        self._parquet_warned = False
+        self._failures = 0
+        self._write_listeners: List[Callable[[], None]] = []
+
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(SCHEMA)
+        conn.commit()
+        logger.info(f"Using SQLite storage: {self.path}")
+
+        self._writer = threading.Thread(target=self._writer_loop, daemon=True)
+        self._writer.start()
+        # Record IDs are handed out before their batch commits; never exit with a queue
+        atexit.register(self.close)
+
+        self._exporter = None
+        if config.PARQUET_EXPORT_INTERVAL > 0 and importlib.util.find_spec('pyarrow') is None:
+            logger.warning("PARQUET_EXPORT_INTERVAL is set but pyarrow is not installed; "
+                           "Parquet export disabled (pip install pyarrow)")
+            self._parquet_warned = True
+        elif config.PARQUET_EXPORT_INTERVAL > 0:
+            self._exporter = threading.Thread(target=self._export_loop, daemon=True)
+            self._exporter.start()
+
+    # ------------------------------------------------------------------
+    # Connections and batched writes
+    # ------------------------------------------------------------------
+
+    def _conn(self) -> sqlite3.Connection:
+        """Per-thread connection; sqlite3 connections are not shared across threads."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._local.conn = conn
+        return conn
+
+    def _enqueue(self, record: tuple, images: List[tuple], refs: List[tuple]):
+        with self._pending_lock:
+            self._pending.append((record, images, refs))
+            full = len(self._pending) >= config.SQLITE_BATCH_SIZE
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        """Write all pending records in one transaction."""
+        with self._write_lock:
+            with self._pending_lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return
+
+            try:
+                self._write_batch(batch)
+                self._notify_write()
+            except sqlite3.OperationalError as e:
+                # Transient (locked database, full disk): keep the batch for the next flush
+                logger.error(f"SQLite batch write failed ({len(batch)} records), will retry: {e}")
+                with self._pending_lock:
+                    self._pending = batch + self._pending
+                raise
+            except Exception as e:
+                logger.error(f"SQLite batch write failed ({len(batch)} records), writing one at a time: {e}")
+                self._write_each(batch)
+
+    def _write_each(self, batch: List[tuple]):
+        """Write records in separate transactions; spill the ones that still fail."""
+        failed = []
+        for item in batch:
+            try:
+                self._write_batch([item])
+            except Exception as e:
+                logger.error(f"SQLite write failed for record {item[0][0]}: {e}")
+                failed.append(item)
+        if len(failed) < len(batch):
+            self._notify_write()
+        self._spill(failed)
+
+    def add_write_listener(self, callback: Callable[[], None]):
+        self._write_listeners.append(callback)
+
+    def _notify_write(self):
+        for callback in self._write_listeners:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"SQLite write listener failed: {e}")
+
+    def _spill(self, batch: List[tuple]):
+        """Move queued records to the spill journal so their IDs are not silently lost."""
+        if batch and not config.DB_JOURNAL_ENABLED:
+            logger.error(f"Spill journal disabled; dropping {len(batch)} traffic record(s)")
+            return
+        for record, images, refs in batch:
+            _, direction, vehicle_count, original_image_id, _, _, detections, image_size, model, created_at = record
+            extension = next((image[1] for image in images if image[0] == original_image_id), None)
+            try:
+                spill_journal.append(
+                    direction, vehicle_count,
+                    self._image_path(original_image_id, extension) if extension else '',
+                    detections=json.loads(detections),
+                    image_size=json.loads(image_size) if image_size else None,
+                    model=model,
+                    created_at=datetime.fromisoformat(created_at)
+                )
+            except Exception as e:
+                logger.error(f"Failed to spill record {record[0]}; dropping it: {e}")
+
+    def _write_batch(self, batch: List[tuple]):
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "INSERT INTO images (id, extension, content_type, length, width, height, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET created_at = excluded.created_at",
+                [image for _, images, _ in batch for image in images]
+            )
+            conn.executemany(
+                f"INSERT INTO traffic_records ({', '.join(RECORD_COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in RECORD_COLUMNS)}) ON CONFLICT(id) DO NOTHING",
+                [record for record, _, _ in batch]
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO record_images (record_id, image_id, rendition) VALUES (?, ?, ?)",
+                [ref for _, _, refs in batch for ref in refs]
+            )
+
+    def _writer_loop(self):
+        while self._running:
+            self._wake.wait(config.SQLITE_FLUSH_INTERVAL)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                pass  # Logged in flush; retried next interval
+
+    def close(self):
+        """Stop the background threads and commit the queue; spill it if that fails."""
+        self._running = False
+        self._closed.set()
+        self._wake.set()
+        try:
+            self.flush()
+        except Exception:
+            with self._write_lock, self._pending_lock:
+                batch, self._pending = self._pending, []
+            self._spill(batch)
+
+    # ------------------------------------------------------------------
+    # Content-addressed images
+    # ------------------------------------------------------------------
+
+    def _image_path(self, image_id: str, extension: str) -> str:
+        return os.path.join(self.image_folder, image_id[:2], f"{image_id}{extension}")
+
+    def _store_image(self, data: bytes, extension: str) -> str:
+        """Write image bytes under their SHA-256; identical frames are stored once."""
+        image_id = hashlib.sha256(data).hexdigest()
+        path = self._image_path(image_id, extension)
+        try:
+            # Restart the compaction grace period; a queued record now refers to it
+            os.utime(path)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return image_id
+
+    def _delete_unreferenced(self, conn: sqlite3.Connection, image_ids: List[str]) -> Tuple[int, int]:
+        """
+        Delete image rows and files no record references; caller holds the write lock.
+
+        A file re-stored within the compaction grace period is kept: a record
+        still in the write queue may have deduplicated to it. Its row is
+        recreated when that record commits, and compaction reclaims the file
+        otherwise.
+        """
+        if not image_ids:
+            return 0, 0
+        placeholders = ', '.join('?' for _ in image_ids)
+        referenced = {row[0] for row in conn.execute(
+            f"SELECT DISTINCT image_id FROM record_images WHERE image_id IN ({placeholders})", image_ids
+        )}
+        orphans = [row for row in conn.execute(
+            f"SELECT id, extension, length FROM images WHERE id IN ({placeholders})", image_ids
+        ) if row['id'] not in referenced]
+
+        with conn:
+            conn.executemany("DELETE FROM images WHERE id = ?", [(row['id'],) for row in orphans])
+        cutoff = time.time() - config.COMPACTION_GRACE_MINUTES * 60
+        removed = []
+        for row in orphans:
+            path = self._image_path(row['id'], row['extension'])
+            try:
+                if os.stat(path).st_mtime < cutoff:
+                    os.remove(path)
+                    removed.append(row)
+            except FileNotFoundError:
+                pass
+        return len(removed), sum(row['length'] for row in removed)
+
+    # ------------------------------------------------------------------
+    # Records
+    # ------------------------------------------------------------------
+
+    def save_traffic_record(
+        self,
+        direction: str,
+        vehicle_count: int,
+        original_image_path: str,
+        detections: Optional[List[Dict[str, Any]]] = None,
+        image_size: Optional[List[int]] = None,
+        model: Optional[str] = None,
+        created_at: Optional[datetime] = None
+    ) -> Optional[str]:
+        """
+        Queue a traffic record for the next batched insert.
+
+        Image renditions are written to disk immediately; the record ID is
+        generated locally so it can be returned before the batch commits.
+        """
+        try:
+            record, images, refs = self._build_record(
+                direction, vehicle_count, original_image_path,
+                detections, image_size, model, created_at
+            )
+            self._enqueue(record, images, refs)
+            logger.info(f"Saved traffic record: {direction} - {vehicle_count} vehicles")
+            return record[0]
+
+        except Exception as e:
+            logger.error(f"Failed to save traffic record: {e}")
+            return None
+
+    def save_traffic_records(self, records: List[Dict[str, Any]]) -> List[str]:
+        """
+        Write many records in one transaction, bypassing the write queue.
+
+        Items with a 'record_id' are idempotent: records that already exist
+        are skipped without storing their images again.
+        """
+        if not records:
+            return []
+        try:
+            requested = [record['record_id'] for record in records if record.get('record_id')]
+            existing = set()
+            if requested:
+                placeholders = ', '.join('?' for _ in requested)
+                existing = {row[0] for row in self._conn().execute(
+                    f"SELECT id FROM traffic_records WHERE id IN ({placeholders})", requested
+                )}
+
+            batch = [self._build_record(**record) for record in records if record.get('record_id') not in existing]
+            if batch:
+                with self._write_lock:
+                    self._write_batch(batch)
+            if existing:
+                logger.info(f"Skipped {len(existing)} traffic record(s) already stored")
+            logger.info(f"Saved {len(batch)} traffic records in bulk")
+
+            built = iter(batch)
+            return [
+                record['record_id'] if record.get('record_id') in existing else next(built)[0][0]
+                for record in records
+            ]
+
+        except Exception as e:
+            logger.error(f"Failed to bulk save {len(records)} traffic records: {e}")
+            return []
+
+    def _build_record(
+        self,
+        direction: str,
+        vehicle_count: int,
+        original_image_path: str,
+        detections: Optional[List[Dict[str, Any]]] = None,
+        image_size: Optional[List[int]] = None,
+        model: Optional[str] = None,
+        created_at: Optional[datetime] = None,
+        record_id: Optional[str] = None
+    ) -> Tuple[tuple, List[tuple], List[tuple]]:
+        """Store image renditions and build the (record, images, refs) rows for a batch."""
+        record_id = record_id or uuid.uuid4().hex
+        created_at = _timestamp(created_at or datetime.utcnow())
+        original_image_id = None
+        thumbnails = {}
+        images = []
+        refs = []
+
+        if os.path.exists(original_image_path):
+            for name, rendition in build_renditions(original_image_path).items():
+                image_id = self._store_image(rendition['data'], rendition['extension'])
+                images.append((
+                    image_id, rendition['extension'], rendition['content_type'],
+                    len(rendition['data']), rendition['width'], rendition['height'], created_at
+                ))
+                refs.append((record_id, image_id, name))
+                if name == 'full':
+                    original_image_id = image_id
+                else:
+                    thumbnails[name] = image_id
+
+        record = (
+            record_id, direction, vehicle_count, original_image_id, None,
+            json.dumps(thumbnails), json.dumps(detections or []),
+            json.dumps(image_size) if image_size else None, model, created_at
+        )
+        return record, images, refs
+
+    def get_record(self, record_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            query = "SELECT * FROM traffic_records WHERE id = ?"
+            row = self._conn().execute(query, (record_id,)).fetchone()
+            if row is None:
+                # Read-your-write: the ID may have been returned before its batch committed
+                self.flush()
+                row = self._conn().execute(query, (record_id,)).fetchone()
+            return _format_row(row) if row else None
+        except Exception as e:
+            self._record_error(e)
+            logger.error(f"Failed to get record {record_id}: {e}")
+            return None
+
+    def get_image(self, image_id: str) -> Optional[Tuple[bytes, str]]:
+        try:
+            row = self._conn().execute(
+                "SELECT extension, content_type FROM images WHERE id = ?", (image_id,)
+            ).fetchone()
+            if row is None:
+                # Renditions hit the disk before their batch commits
+                self.flush()
+                row = self._conn().execute(
+                    "SELECT extension, content_type FROM images WHERE id = ?", (image_id,)
+                ).fetchone()
+            if row is None:
+                return None
+            with open(self._image_path(image_id, row['extension']), 'rb') as f:
+                return f.read(), row['content_type']
+        except Exception as e:
+            self._record_error(e)
+            logger.error(f"Failed to get image {image_id}: {e}")
+            return None
+
+    def get_history(
+        self,
+        direction: Optional[str] = None,
+        page: int = 1,
+        per_page: int = 20,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        try:
+            conn = self._conn()
+
+            clauses = []
+            params = []
+            if direction:
+                clauses.append("direction = ?")
+                params.append(direction)
+            if start_date:
+                clauses.append("created_at >= ?")
+                params.append(_timestamp(start_date))
+            if end_date:
+                clauses.append("created_at <= ?")
+                params.append(_timestamp(end_date))
+            where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+            total = conn.execute(f"SELECT COUNT(*) FROM traffic_records {where}", params).fetchone()[0]
+            pages = (total + per_page - 1) // per_page
+
+            rows = conn.execute(
+                f"SELECT * FROM traffic_records {where} ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                params + [per_page, (page - 1) * per_page]
+            ).fetchall()
+
+            return {
+                'records': [_format_row(row) for row in rows],
+                'total': total,
+                'page': page,
+                'pages': pages
+            }
+
+        except Exception as e:
+            self._record_error(e)
+            logger.error(f"Failed to get history: {e}")
+            return {'records': [], 'total': 0, 'page': 1, 'pages': 0}
+
+    def get_trends(self, period: str = 'hourly', days: int = 7) -> List[Dict[str, Any]]:
+        try:
+            start_date = _timestamp(datetime.utcnow() - timedelta(days=days))
+
+            if period == 'daily':
+                period_expr = "substr(created_at, 1, 10)"
+            else:  # hourly
+                period_expr = "substr(created_at, 1, 13) || ':00:00'"
+
+            rows = self._conn().execute(
+                f"""
+                SELECT direction, {period_expr} AS period,
+                       AVG(vehicle_count) AS avg_count,
+                       MAX(vehicle_count) AS max_count,
+                       MIN(vehicle_count) AS min_count,
+                       COUNT(*) AS total_records
+                FROM traffic_records
+                WHERE created_at >= ?
+                GROUP BY direction, period
+                ORDER BY period
+                """,
+                (start_date,)
+            ).fetchall()
+
+            return [
+                {
+                    'direction': row['direction'],
+                    'period': row['period'],
+                    'avg_count': round(row['avg_count'], 1),
+                    'max_count': row['max_count'],
+                    'min_count': row['min_count'],
+                    'total_records': row['total_records']
+                }
+                for row in rows
+            ]
+
+        except Exception as e:
+            self._record_error(e)
+            logger.error(f"Failed to get trends: {e}")
+            return []
+
+    def get_stats(self) -> Dict[str, Any]:
+        try:
+            conn = self._conn()
+            now = datetime.utcnow()
+
+            total_records = conn.execute("SELECT COUNT(*) FROM traffic_records").fetchone()[0]
+
+            today_start = _timestamp(now.replace(hour=0, minute=0, second=0, microsecond=0))
+            today_records = conn.execute(
+                "SELECT COUNT(*) FROM traffic_records WHERE created_at >= ?", (today_start,)
+            ).fetchone()[0]
+
+            direction_stats = {
+                row['direction']: {
+                    'total_vehicles': row['total_vehicles'],
+                    'avg_vehicles': round(row['avg_vehicles'], 1),
+                    'record_count': row['record_count']
+                }
+                for row in conn.execute(
+                    """
+                    SELECT direction, SUM(vehicle_count) AS total_vehicles,
+                           AVG(vehicle_count) AS avg_vehicles, COUNT(*) AS record_count
+                    FROM traffic_records GROUP BY direction
+                    """
+                )
+            }
+
+            # Peak hours (last 7 days)
+            week_ago = _timestamp(now - timedelta(days=7))
+            peak_hours = [
+                row[0] for row in conn.execute(
+                    """
+                    SELECT CAST(substr(created_at, 12, 2) AS INTEGER) AS hour
+                    FROM traffic_records WHERE created_at >= ?
+                    GROUP BY hour ORDER BY AVG(vehicle_count) DESC LIMIT 3
+                    """,
+                    (week_ago,)
+                )
+            ]
+
+            return {
+                'total_records': total_records,
+                'today_records': today_records,
+                'by_direction': direction_stats,
+                'peak_hours': peak_hours,
+                'last_updated': now.isoformat()
+            }
+
+        except Exception as e:
+            self._record_error(e)
+            logger.error(f"Failed to get stats: {e}")
+            return {
+                'total_records': 0,
+                'today_records': 0,
+                'by_direction': {},
+                'peak_hours': [],
+                'last_updated': datetime.utcnow().isoformat()
+            }
+
+    def get_counts_since(self, since: datetime) -> List[Tuple[str, datetime, int]]:
+        try:
+            # Forecast seeding must see every record saved before its cutoff
+            self.flush()
+            rows = self._conn().execute(
+                "SELECT direction, created_at, vehicle_count FROM traffic_records "
+                "WHERE created_at >= ? ORDER BY created_at",
+                (_timestamp(since),)
+            )
+            return [(row[0], datetime.fromisoformat(row[1]), row[2]) for row in rows]
+
+        except Exception as e:
+            self._record_error(e)
+            logger.error(f"Failed to get counts: {e}")
+            return []
+
+    # ------------------------------------------------------------------
+    # Retention
+    # ------------------------------------------------------------------
+
+    def expire_record_images(
+        self,
+        field: str,
+        older_than: datetime,
+        batch_size: int = 500
+    ) -> Dict[str, int]:
+        if field not in IMAGE_FIELDS:
+            raise ValueError(f"Unknown image field: {field}")
+
+        conn = self._conn()
+        deleted = {'files': 0, 'bytes': 0}
+
+        while True:
+            with self._write_lock:
+                rows = conn.execute(
+                    f"SELECT id, {field} FROM traffic_records "
+                    f"WHERE created_at < ? AND {field} IS NOT NULL LIMIT ?",
+                    (_timestamp(older_than), batch_size)
+                ).fetchall()
+                if not rows:
+                    break
+
+                record_ids = [(row['id'],) for row in rows]
+                with conn:
+                    conn.executemany(f"UPDATE traffic_records SET {field} = NULL WHERE id = ?", record_ids)
+                    conn.executemany(
+                        "DELETE FROM record_images WHERE record_id = ? AND rendition = ?",
+                        [(row['id'], IMAGE_FIELDS[field]) for row in rows]
+                    )
+                files, size = self._delete_unreferenced(conn, list({row[field] for row in rows}))
+                deleted['files'] += files
+                deleted['bytes'] += size
+
+            if len(rows) < batch_size:
+                break
+
+        return deleted
+
+    def delete_records_before(self, older_than: datetime) -> int:
+        conn = self._conn()
+        cutoff = _timestamp(older_than)
+        with self._write_lock, conn:
+            conn.execute(
+                "DELETE FROM record_images WHERE record_id IN "
+                "(SELECT id FROM traffic_records WHERE created_at < ?)", (cutoff,)
+            )
+            return conn.execute("DELETE FROM traffic_records WHERE created_at < ?", (cutoff,)).rowcount
+
+    def _stored_files(self, after_name: Optional[str], limit: int) -> List[str]:
+        """Up to limit file names in the image store after a cursor, in name order."""
+        names = []
+        try:
+            buckets = sorted(os.listdir(self.image_folder))
+        except FileNotFoundError:
+            return names
+        for bucket in buckets:
+            if after_name and bucket < after_name[:2]:
+                continue
+            folder = os.path.join(self.image_folder, bucket)
+            if not os.path.isdir(folder):
+                continue
+            for name in sorted(os.listdir(folder)):
+                if after_name and name <= after_name:
+                    continue
+                names.append(name)
+                if len(names) == limit:
+                    return names
+        return names
+
+    def purge_orphaned_images(
+        self,
+        after_id: Optional[str] = None,
+        batch_size: int = 500,
+        grace_period: timedelta = timedelta(minutes=10)
+    ) -> Dict[str, Any]:
+        """
+        Scan one batch of image files on disk and delete those no record references.
+
+        Files are reconciled against record_images rather than the images
+        table, so renditions whose record never committed (crash, dropped
+        batch) are reclaimed too, along with stale partial writes. The
+        cursor is a file name.
+        """
+        names = self._stored_files(after_id, batch_size)
+        if not names:
+            return {'scanned': 0, 'purged': 0, 'bytes': 0, 'last_id': None}
+
+        cutoff = time.time() - grace_period.total_seconds()
+        candidates: Dict[str, List[Tuple[str, int]]] = {}
+        partial = []
+        for name in names:
+            path = os.path.join(self.image_folder, name[:2], name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if stat.st_mtime >= cutoff:
+                continue
+            if name.endswith('.tmp'):
+                partial.append((path, stat.st_size))
+            else:
+                candidates.setdefault(name.split('.', 1)[0], []).append((path, stat.st_size))
+
+        conn = self._conn()
+        orphans = list(partial)
+        with self._write_lock:
+            image_ids = list(candidates)
+            if image_ids:
+                placeholders = ', '.join('?' for _ in image_ids)
+                referenced = {row[0] for row in conn.execute(
+                    f"SELECT DISTINCT image_id FROM record_images WHERE image_id IN ({placeholders})", image_ids
+                )}
+                unreferenced = [image_id for image_id in image_ids if image_id not in referenced]
+                with conn:
+                    conn.executemany("DELETE FROM images WHERE id = ?", [(image_id,) for image_id in unreferenced])
+                for image_id in unreferenced:
+                    orphans.extend(candidates[image_id])
+
+            removed = []
+            for path, size in orphans:
+                try:
+                    # Skip files an upload re-stored since the scan
+                    if os.stat(path).st_mtime < cutoff:
+                        os.remove(path)
+                        removed.append((path, size))
+                except FileNotFoundError:
+                    pass
+        orphans = removed
+
+        return {
+            'scanned': len(names),
+            'purged': len(orphans),
+            'bytes': sum(size for _, size in orphans),
+            'last_id': names[-1] if len(names) == batch_size else None
+        }
+
+    def check_connection(self) -> bool:
+        try:
+            self._conn().execute("SELECT 1")
+            return True
+        except Exception:
+            return False
+
+    def _record_error(self, error: Exception):
+        """Count database failures; a missing row or image file is not one."""
+        if isinstance(error, sqlite3.DatabaseError):
+            self._failures += 1
+
+    def failure_count(self) -> int:
+        return self._failures
+
+    def status(self) -> Dict[str, Any]:
+        with self._pending_lock:
+            pending = len(self._pending)
+        return {'available': True, 'path': self.path, 'pending_writes': pending}
+
+    # ------------------------------------------------------------------
+    # Parquet export
+    # ------------------------------------------------------------------
+
+    def export_parquet(self) -> Optional[str]:
+        """
+        Export records added since the last export to a new Parquet file.
+
+        Progress is tracked by rowid, so backfilled records with old
+        timestamps are still exported. Requires pyarrow.
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            if not self._parquet_warned:
+                logger.warning("pyarrow not installed. Parquet export disabled.")
+                self._parquet_warned = True
+            return None
+
+        conn = self._conn()
+        row = conn.execute("SELECT value FROM meta WHERE key = 'parquet_last_rowid'").fetchone()
+        last_rowid = int(row[0]) if row else 0
+
+        rows = conn.execute(
+            "SELECT rowid, id, direction, vehicle_count, model, created_at "
+            "FROM traffic_records WHERE rowid > ? ORDER BY rowid",
+            (last_rowid,)
+        ).fetchall()
+        if not rows:
+            return None
+
+        rowids, ids, directions, counts, models, created = zip(*rows)
+        table = pa.table({
+            'id': pa.array(ids, pa.string()),
+            'direction': pa.array(directions, pa.string()),
+            'vehicle_count': pa.array(counts, pa.int32()),
+            'model': pa.array(models, pa.string()),
+            'created_at': pa.array([datetime.fromisoformat(value) for value in created], pa.timestamp('us'))
+        })
+
+        os.makedirs(config.PARQUET_EXPORT_FOLDER, exist_ok=True)
+        filename = f"traffic_records_{datetime.utcnow():%Y%m%dT%H%M%S}_{rowids[-1]}.parquet"
+        path = os.path.join(config.PARQUET_EXPORT_FOLDER, filename)
+        pq.write_table(table, f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+
+        with self._write_lock, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('parquet_last_rowid', ?)",
+                (str(rowids[-1]),)
+            )
+
+        logger.info(f"Exported {len(rows)} record(s) to {path}")
+        return path
+
+    def _export_loop(self):
+        while not self._closed.wait(config.PARQUET_EXPORT_INTERVAL):
+            try:
+                self.export_parquet()
+            except Exception as e:
+                logger.error(f"Parquet export failed: {e}")
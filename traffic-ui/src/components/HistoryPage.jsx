@@ -2,6 +2,10 @@ import React, { useState, useEffect } from 'react';
 import { FaHistory, FaFilter, FaChevronLeft, FaChevronRight, FaEye, FaCalendarAlt, FaRoad } from 'react-icons/fa';
 import { API_URL } from '../config';
 
+// Thumbnails outlive the raw frame, and the annotated endpoint falls back to them
+const hasImage = (record) =>
+    Boolean(record.original_image_id || record.processed_image_id || record.thumbnails?.medium || record.thumbnails?.small);
+
 const HistoryPage = () => {
     const [records, setRecords] = useState([]);
     const [loading, setLoading] = useState(true);
@@ -127,9 +131,11 @@ const HistoryPage = () => {
                             >
                                 {/* Image Thumbnail */}
                                 <div className="relative aspect-video rounded-lg overflow-hidden bg-surface-800 mb-4">
-                                    {record.processed_image_id ? (
+                                    {hasImage(record) ? (
                                         <img
-                                            src={`${API_URL}/api/image/${record.processed_image_id}`}
+                                            src={record.thumbnails?.medium
+                                                ? `${API_URL}/api/image/${record.thumbnails.medium}`
+                                                : `${API_URL}/api/records/${record.id}/annotated`}
                                             alt={`${record.direction} traffic`}
                                             className="w-full h-full object-cover group-hover:scale-105 transition-transform"
                                         />
@@ -211,9 +217,9 @@ const HistoryPage = () => {
                                 </button>
                             </div>
 
-                            {selectedImage.processed_image_id && (
+                            {hasImage(selectedImage) && (
                                 <img
-                                    src={`${API_URL}/api/image/${selectedImage.processed_image_id}`}
+                                    src={`${API_URL}/api/records/${selectedImage.id}/annotated`}
                                     alt={`${selectedImage.direction} traffic`}
                                     className="w-full rounded-lg mb-4"
                                 />
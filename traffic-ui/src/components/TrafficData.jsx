@@ -11,6 +11,45 @@ import {
 import { Tooltip } from "react-tooltip";
 import "react-tooltip/dist/react-tooltip.css";
 
+// Draws detection boxes over a frame; "slice" matches the image's object-cover crop
+const DetectionOverlay = ({ detections, imageSize }) => {
+  const [width, height] = imageSize;
+  return (
+    <svg
+      className="absolute inset-0 w-full h-full pointer-events-none"
+      viewBox={`0 0 ${width} ${height}`}
+      preserveAspectRatio="xMidYMid slice"
+    >
+      {detections.map((detection, index) => {
+        const [x1, y1, x2, y2] = detection.box;
+        const color = detection.confidence > 0.7 ? "#22c55e" : "#facc15";
+        return (
+          <g key={index}>
+            <rect
+              x={x1}
+              y={y1}
+              width={x2 - x1}
+              height={y2 - y1}
+              fill="none"
+              stroke={color}
+              strokeWidth={Math.max(width / 320, 2)}
+            />
+            <text
+              x={x1}
+              y={Math.max(y1 - 6, 12)}
+              fill={color}
+              fontSize={Math.max(width / 60, 12)}
+              fontWeight="bold"
+            >
+              {`${detection.label} ${Math.round(detection.confidence * 100)}%`}
+            </text>
+          </g>
+        );
+      })}
+    </svg>
+  );
+};
+
 const laneIcons = {
   north: <FaArrowUp />,
   south: <FaArrowDown />,
@@ -152,10 +191,13 @@ const TrafficData = ({ trafficData, clearTrafficData }) => {
                 {data.image_url && (
                   <div className="relative mb-5 rounded-xl overflow-hidden shadow-lg ring-1 ring-white/10">
                     <img
-                      src={`${data.image_url}?t=${new Date().getTime()}`}
+                      src={data.thumbnail_urls?.medium || `${data.image_url}?t=${new Date().getTime()}`}
                       alt={`${direction} traffic`}
                       className="w-full h-48 object-cover"
                     />
+                    {data.detections && data.image_size && (
+                      <DetectionOverlay detections={data.detections} imageSize={data.image_size} />
+                    )}
                     <div className="absolute bottom-0 left-0 right-0 bg-gradient-to-t from-black/80 to-transparent p-4">
                       <div className="flex items-center gap-2 text-xs text-white/70">
                         <FaClock />